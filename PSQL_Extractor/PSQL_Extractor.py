@@ -1,7 +1,24 @@
 #! /usr/bin/python3
 
-import os, argparse
+import os, argparse, time
 import re, json, psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from external_sort import ExternalSortWriter
+import copy_reader
+from repo_url import parse_repo_url, canonical_repo_url
+from package_io import format_extensions, read_packages, write_packages
+from dedupe_store import MemoryDedupeStore, NullDedupeStore, StagedDedupeStore, open_dedupe_store
+from thresholds import ThresholdSplitter, open_threshold_stores
+from copy_reader import INT, TEXT, BOOL, JSONB, TEXT_ARRAY
+from metrics import ExtractionMetrics
+from row_cache import RowCacheWriter, read_row_cache, cache_path
+from fetch_pipeline import AdaptiveBatchSize, prefetch_batches
+from resumable import ResumableExtraction
+import logger
 
 localhost_password = os.environ.get("PSQL_Password") or 'postgres'
 
@@ -13,27 +30,82 @@ db_credentials = {
     "port": "5432"  # Default PostgreSQL port
 }
 
-unique_urls = set()
+# Repositories already emitted. Replaced in main() when a persistent store is selected.
+unique_urls = MemoryDedupeStore()
 
-def get_total_package_count(ecosystem : str) -> int:
+# Counters of the extraction in progress. Replaced for every ecosystem.
+metrics = ExtractionMetrics("extractor", interval=None)
+metrics_interval = 30.0
+
+# Memory the rows of one fetched batch may take. Batch sizes adapt to the observed row size.
+fetch_memory_mb = 64
+
+checkpoint_file = "extracted/checkpoints.json"
+
+# Appended to output file names. A run with a persistent dedupe store only emits the repositories earlier
+# runs haven't, so its output gets a name of its own instead of replacing an earlier, fuller output.
+output_suffix = ""
+
+# Raw rows recorded with --row-cache record, one file per (ecosystem, filter_count)
+row_cache_dir = "extracted/row_cache"
+
+# Write-ahead segments and state of --resumable extractions, one directory per (ecosystem, filter_count)
+resume_dir = "extracted/resume"
+
+packages_query = """
+        SELECT 
+            id, registry_id, name, ecosystem, licenses,
+            repository_url, homepage, normalized_licenses, repo_metadata, downloads
+        FROM 
+            packages
+        WHERE 
+            ecosystem = %s AND downloads >= %s
+"""
+packages_column_types = (INT, INT, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT_ARRAY, JSONB, INT)
+
+# Server-side projection of packages_query. Only the repo_metadata keys process_record reads leave
+# Postgres, and rows without a usable repository URL are dropped before they are sent.
+projected_query = """
+        SELECT 
+            id, ecosystem, licenses, normalized_licenses, repo_url,
+            repo_metadata IS NOT NULL AND repo_metadata <> '{}'::jsonb,
+            repo_metadata->>'full_name', repo_metadata->'owner', repo_metadata->'license',
+            repo_metadata->'language', repo_metadata->'stargazers_count', downloads
+        FROM 
+            (SELECT *, COALESCE(NULLIF(repository_url, ''), homepage) AS repo_url FROM packages) AS packages
+        WHERE 
+            ecosystem = %s AND downloads >= %s
+            AND btrim(repo_url) <> ''
+            AND (
+                (repo_metadata IS NOT NULL AND repo_metadata <> '{}'::jsonb)
+                OR repo_url ~* '(github|gitlab)\\.com[:/]+[^/]+/[^/]+'
+            )
+"""
+projected_column_types = (INT, TEXT, TEXT, TEXT_ARRAY, TEXT, BOOL, TEXT, JSONB, JSONB, JSONB, JSONB, INT)
+
+def get_total_package_count(ecosystem : str, pool=None) -> int:
     """
     Retrieves the total count of packages for a given ecosystem.
 
     Parameters:
     - ecosystem (str): Ecosystem Name.
+    - pool (optional): Connection pool to borrow a connection from, instead of opening a new one.
 
     Returns:
     - total_count (int): Total package count for specified ecosystem.
     """
 
-    conn = psycopg2.connect(**db_credentials)
+    conn = pool.getconn() if pool else psycopg2.connect(**db_credentials)
     cursor = conn.cursor()
 
     cursor.execute("SELECT COUNT(*) FROM packages WHERE ecosystem = %s;", (ecosystem,))
     total_count = cursor.fetchone()[0]
 
     cursor.close()
-    conn.close()
+    if pool:
+        pool.putconn(conn)
+    else:
+        conn.close()
     return total_count
 
 def process_record_o(record : list) -> None or dict:
@@ -114,29 +186,38 @@ def process_record_o(record : list) -> None or dict:
     
     return None
 
-def process_record(record: list) -> dict or None:
+def process_record(record: list, seen=None, stats=None) -> dict or None:
     """
     Process a single database record and extract package information.
 
     Parameters:
     - record (list): A list representing a single database record.
+    - seen (optional): Dedupe store to check `package_repo` against. Defaults to `unique_urls`.
+    - stats (ExtractionMetrics, optional): Where dropped rows are counted. Defaults to `metrics`.
 
     Returns:
     - dict: A dictionary with processed package information, or None if crucial fields are missing.
     """
 
 
+    if stats is None:
+        stats = metrics
+
     package_repo = record[5] or record[6]
 
     if not package_repo or not package_repo.strip():
+        stats.drop("no_repo_url")
         return None
 
     repo_metadata = record[8]
 
-    if repo_metadata != {}:
-        package_name = repo_metadata.get("full_name", "").split('/')[-1]
+    # NULL and '{}' both mean no metadata, like has_metadata in projected_query. A null full_name
+    # counts as missing, like repo_metadata->>'full_name' there.
+    if repo_metadata:
+        package_name = (repo_metadata.get("full_name") or "").split('/')[-1]
         package_owner_github = repo_metadata.get("owner")
         if not package_owner_github or not package_name:
+            stats.drop("missing_owner_or_name")
             return None
 
         package_licenses = {
@@ -147,22 +228,27 @@ def process_record(record: list) -> dict or None:
 
         package_language = repo_metadata.get("language")
         package_starcount = repo_metadata.get("stargazers_count")
-        package_repo = f"https://github.com/{package_owner_github}/{package_name}"
+        package_repo = canonical_repo_url("github", package_owner_github, package_name)
 
     else:
-        match = re.match(r"https?://(?:www\.)?(github|gitlab)\.com/([^/]+)/([^/]+)", package_repo)
-        if not match:
+        repo_parts = parse_repo_url(package_repo)
+        if not repo_parts:
+            stats.drop("url_not_matched")
             return None
 
-        package_name, package_owner_github = match.group(3), match.group(2)
+        _, package_owner_github, package_name = repo_parts
+        package_repo = canonical_repo_url(*repo_parts)
         package_licenses, package_language, package_starcount = None, None, None
 
     if not package_name or not package_owner_github:
+        stats.drop("missing_owner_or_name")
         return None
 
-    # Assuming unique_urls is a set defined outside this function
-    if package_repo not in unique_urls:
-        unique_urls.add(package_repo)
+    if seen is None:
+        seen = unique_urls
+
+    if package_repo not in seen:
+        seen.add(package_repo)
         return {
             "package_repo": package_repo,
             "package_name": package_name,
@@ -174,8 +260,94 @@ def process_record(record: list) -> dict or None:
             "downloads": record[9]
         }
 
+    stats.drop("duplicate")
+    return None
+
+
+
+def process_record_projected(record: tuple, seen=None, stats=None) -> dict or None:
+    """
+    Same as process_record, but for a row of projected_query.
+
+    Parameters:
+    - record (tuple): (id, ecosystem, licenses, normalized_licenses, repo_url, has_metadata,
+      full_name, owner, license, language, stargazers_count, downloads)
+    - seen (optional): Dedupe store to check `package_repo` against. Defaults to `unique_urls`.
+    - stats (ExtractionMetrics, optional): Where dropped rows are counted. Defaults to `metrics`.
+
+    Returns:
+    - dict: A dictionary with processed package information, or None if crucial fields are missing.
+    """
+
+    if stats is None:
+        stats = metrics
+
+    package_repo = record[4]
+
+    if not package_repo or not package_repo.strip():
+        stats.drop("no_repo_url")
+        return None
+
+    if record[5]:
+        package_name = (record[6] or "").split('/')[-1]
+        package_owner_github = record[7]
+        if not package_owner_github or not package_name:
+            stats.drop("missing_owner_or_name")
+            return None
+
+        package_licenses = {
+            "Normalised License": record[2],
+            "licenses": record[3],
+            "GitHub_License": record[8]
+        }
+
+        package_language = record[9]
+        package_starcount = record[10]
+        package_repo = canonical_repo_url("github", package_owner_github, package_name)
+
+    else:
+        repo_parts = parse_repo_url(package_repo)
+        if not repo_parts:
+            stats.drop("url_not_matched")
+            return None
+
+        _, package_owner_github, package_name = repo_parts
+        package_repo = canonical_repo_url(*repo_parts)
+        package_licenses, package_language, package_starcount = None, None, None
+
+    if not package_name or not package_owner_github:
+        stats.drop("missing_owner_or_name")
+        return None
+
+    if seen is None:
+        seen = unique_urls
+
+    if package_repo not in seen:
+        seen.add(package_repo)
+        return {
+            "package_repo": package_repo,
+            "package_name": package_name,
+            "repo_owner": package_owner_github,
+            "package_ecosystem": record[1],
+            "package_licenses": package_licenses,
+            "package_language": package_language,
+            "package_starcount": package_starcount,
+            "downloads": record[11]
+        }
+
+    stats.drop("duplicate")
     return None
 
+def select_query(projected : bool) -> tuple:
+    """
+    Returns:
+    - (query, processor, column_types) (tuple): The packages query, the function that processes its rows
+      and the column types needed to decode it through COPY.
+    """
+
+    if projected:
+        return projected_query, process_record_projected, projected_column_types
+    return packages_query, process_record, packages_column_types
 
 
 def main():
@@ -183,10 +355,46 @@ def main():
     parser.add_argument('--maven', action='store_true', help="Extract packages for Maven ecosystem.")
     parser.add_argument('--npm', action='store_true', help="Extract packages for npm ecosystem.")
     parser.add_argument('--pypi', action='store_true', help="Extract packages for PyPI ecosystem.")
-    parser.add_argument('--filter-count', type=int, default=100, help="Minimum number of downloads to filter the packages.")
+    parser.add_argument('--filter-count', type=int, nargs='+', default=[100], help="Minimum number of downloads to filter the packages. Several values are extracted in one scan, with one output and one dedupe scope per value.")
     parser.add_argument('--display-db-size', action='store_true', help="Display the size of the database.")
+    parser.add_argument('--output-format', choices=list(format_extensions), default='ndjson', help="Output file format. 'gzip' and 'zstd' write compressed NDJSON, 'parquet' a columnar file.")
+    parser.add_argument('--concurrent', action='store_true', help="Extract the selected ecosystems at the same time over a shared connection pool.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes. Each worker extracts its own id range.")
+    parser.add_argument('--project', action='store_true', help="Extract only the needed repo_metadata keys in SQL and drop rows without a repository URL server-side.")
+    parser.add_argument('--engine', choices=['cursor', 'copy-text', 'copy-binary'], default='cursor', help="How rows are read from Postgres. The COPY engines stream the result instead of fetching batches.")
+    parser.add_argument('--incremental', action='store_true', help="Only fetch packages past the last checkpoint and merge them into the existing output.")
+    parser.add_argument('--checkpoint-column', choices=['id', 'updated_at'], default='id', help="Watermark column for --incremental. 'updated_at' also picks up changed packages.")
+    parser.add_argument('--dedupe-store', choices=['memory', 'sqlite'], default='memory', help="Where seen repositories are kept. 'sqlite' persists across runs, so repositories emitted by earlier runs are skipped and each run's output, holding only the new ones, is written to a new file with a timestamp suffix.")
+    parser.add_argument('--dedupe-path', default="extracted/seen_repos.sqlite", help="SQLite file for the persistent dedupe store. With several --filter-count values, each gets its own file, e.g. seen_repos_1000.sqlite.")
+    parser.add_argument('--metrics-interval', type=float, default=30.0, help="Seconds between progress reports in the log. A JSON summary is written to logs/ at the end of each ecosystem.")
+    parser.add_argument('--sort-buffer-mb', type=int, default=None, help="Stream output through an on-disk merge sort, keeping at most this many MB of records in memory.")
+    parser.add_argument('--fetch-memory-mb', type=float, default=64, help="Memory budget of one batch of fetched rows. The batch size adapts to the size of the rows seen so far.")
+    parser.add_argument('--resumable', action='store_true', help="Write processed packages to on-disk segments as the extraction goes. A run that dies is continued by running the same command again.")
+    parser.add_argument('--segment-rows', type=int, default=50000, help="Rows per write-ahead segment with --resumable.")
+    parser.add_argument('--row-cache', choices=['record', 'replay'], default=None, help="'record' saves the raw query rows to extracted/row_cache while extracting. 'replay' processes the saved rows without connecting to Postgres.")
     args = parser.parse_args()
 
+    filter_counts = sorted(set(args.filter_count))
+    filter_count = filter_counts[0]
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+
+    if len(filter_counts) > 1 and (args.workers > 1 or args.incremental or args.row_cache):
+        parser.error("Several --filter-count values need a single-connection full extraction (no --workers, --incremental or --row-cache).")
+    if args.resumable and (args.workers > 1 or args.incremental or args.row_cache or len(filter_counts) > 1):
+        parser.error("--resumable only works with single-connection full extractions of one --filter-count (no --workers, --incremental or --row-cache).")
+    if args.row_cache and (args.workers > 1 or args.incremental):
+        parser.error("--row-cache only works with single-connection full extractions (no --workers or --incremental).")
+    if args.incremental and (args.workers > 1 or args.sort_buffer_mb or args.display_db_size):
+        parser.error("--incremental merges into the existing output over a single connection, it can't be combined with --workers, --sort-buffer-mb or --display-db-size.")
+    if args.incremental and args.dedupe_store != "memory":
+        parser.error("--incremental merges updated packages into the existing output, it can't use a persistent --dedupe-store, which would skip them as already seen.")
+    if args.concurrent and (args.workers > 1 or args.incremental or args.row_cache or args.resumable or len(filter_counts) > 1):
+        parser.error("--concurrent only works with full extractions of one --filter-count (no --workers, --incremental, --row-cache or --resumable).")
+    if args.row_cache == "replay" and args.display_db_size:
+        parser.error("--display-db-size needs the database, it can't be used with --row-cache replay.")
+
     ecosystems = [ecosystem for ecosystem in ['maven', 'npm', 'pypi'] if getattr(args, ecosystem)]
 
     if not ecosystems:
@@ -197,11 +405,455 @@ def main():
             return
         ecosystems = [user_input_ecosystem]
 
+    global unique_urls, metrics_interval, fetch_memory_mb, output_suffix
+    metrics_interval = args.metrics_interval
+    fetch_memory_mb = args.fetch_memory_mb
+    if args.dedupe_store != "memory":
+        output_suffix = time.strftime("_%Y%m%d-%H%M%S")
+
+    logger.init_logger()
+
+    # Repos only reach the stores once the output they are in has been written, see finish_output.
+    # A run that dies before that leaves a persistent store as it was.
+    if len(filter_counts) > 1:
+        stores = {threshold: StagedDedupeStore(store) for threshold, store in open_threshold_stores(args.dedupe_store, args.dedupe_path, filter_counts).items()}
+        for ecosystem in ecosystems:
+            process_ecosystem_thresholds(ecosystem, filter_counts, stores, args.display_db_size, args.sort_buffer_mb, args.project, args.engine, args.output_format)
+        for store in stores.values():
+            store.close()
+        return
+
+    unique_urls = StagedDedupeStore(open_dedupe_store(args.dedupe_store, args.dedupe_path))
+
+    if args.concurrent:
+        process_ecosystems_concurrently(ecosystems, filter_count, args.display_db_size, args.sort_buffer_mb, args.project, args.engine, args.output_format)
+        ecosystems = []
+
     for ecosystem in ecosystems:
-        process_ecosystem(ecosystem, args.filter_count, args.display_db_size)
+        if args.incremental:
+            process_ecosystem_incremental(ecosystem, filter_count, args.checkpoint_column, args.project, args.engine, args.output_format)
+            continue
+
+        if args.resumable:
+            process_ecosystem_resumable(ecosystem, filter_count, args.display_db_size, args.sort_buffer_mb, args.project, args.engine, args.output_format, args.segment_rows)
+            continue
+
+        process_ecosystem(ecosystem, filter_count, args.display_db_size, args.workers, args.sort_buffer_mb, args.project, args.engine, args.output_format, args.row_cache)
+
+    unique_urls.close()
+
+
+def get_id_bounds(ecosystem : str, filter_count : int) -> tuple:
+    """
+    Retrieves the smallest and largest package id matching the ecosystem and download filter.
+
+    Parameters:
+    - ecosystem (str): Ecosystem Name.
+    - filter_count (int): The minimum number of downloads required to process a package.
+
+    Returns:
+    - (min_id, max_id) (tuple): Both are None if no package matches.
+    """
+
+    conn = psycopg2.connect(**db_credentials)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT MIN(id), MAX(id) FROM packages WHERE ecosystem = %s AND downloads >= %s;", (ecosystem, filter_count))
+    min_id, max_id = cursor.fetchone()
+
+    cursor.close()
+    conn.close()
+    return min_id, max_id
+
+def split_id_range(min_id : int, max_id : int, workers : int) -> list:
+    """
+    Splits the inclusive id range [min_id, max_id] into at most `workers` contiguous ranges.
+
+    Returns:
+    - list of (low, high) tuples, both ends inclusive, in ascending id order.
+    """
+
+    span = max_id - min_id + 1
+    step = -(-span // workers) # Ceiling division
+    return [(low, min(low + step - 1, max_id)) for low in range(min_id, max_id + 1, step)]
+
+def new_batch_size() -> AdaptiveBatchSize:
+    # Two batches are held at once, the one being processed and the one being fetched
+    return AdaptiveBatchSize(fetch_memory_mb * 1024 * 1024 / 2)
+
+def fetch_records(cursor, query : str, params : tuple, packages_list=None, processor=process_record, stats=None):
+    """
+    Runs the packages query on a cursor and processes every returned row.
+
+    Parameters:
+    - packages_list (optional): Sink for processed packages. Anything with an `append` method.
+    - processor (optional): Function turning one row into a package dict or None. Must match the query.
+    - stats (ExtractionMetrics, optional): Where fetches and processing are counted. Defaults to `metrics`.
+
+    Returns:
+    - packages_list, with processed package dicts appended in the order the rows were fetched.
+    """
+
+    if packages_list is None:
+        packages_list = []
+    if stats is None:
+        stats = metrics
+
+    # Query returns list. Each field is a list item in-order. 
+    # So, id field is record[0], registry_id is record[1], name is record[2] and so on
+
+    cursor.execute(query, params)
+
+    def fetch(size):
+        # Keeps iteration over the cursor on the same round trip size
+        cursor.itersize = size
+        return cursor.fetchmany(size)
+
+    for records in prefetch_batches(fetch, new_batch_size(), stats.record_fetch):
+        process_batch(records, packages_list, processor, stats)
+
+    return packages_list
+
+def process_batch(records : list, packages_list, processor, stats=None):
+    """
+    Runs processor over a batch of rows and appends the packages it returns. The time spent in
+    processor and in packages_list.append is recorded apart in stats (default: `metrics`).
+    """
+
+    if stats is None:
+        stats = metrics
+
+    started = time.perf_counter()
+    sink_seconds = 0.0
+    emitted = 0
+
+    # Appended one by one, sinks like ResumableExtraction expect every earlier package to be in
+    # before the next row is processed
+    for record in records:
+        package_info = processor(record)
+        if package_info:
+            appended = time.perf_counter()
+            packages_list.append(package_info)
+            sink_seconds += time.perf_counter() - appended
+            emitted += 1
+
+    stats.record_process(time.perf_counter() - started - sink_seconds, emitted)
+    stats.record_sink(sink_seconds)
+    stats.maybe_report()
+
+def fetch_records_copy(conn, query : str, params : tuple, column_types : tuple, packages_list=None, processor=process_record, binary=False, stats=None):
+    """
+    Same as fetch_records, but streams the rows through `COPY (query) TO STDOUT` instead of a named cursor.
+
+    Parameters:
+    - conn: psycopg2 connection.
+    - column_types (tuple): Column types of the query, see copy_reader.
+    - binary (bool, optional): Use COPY binary format instead of text.
+
+    Returns:
+    - packages_list, with processed package dicts appended in the order the rows were received.
+    """
+
+    if packages_list is None:
+        packages_list = []
+    if stats is None:
+        stats = metrics
+
+    rows = copy_reader.copy_rows(conn, query, params, column_types, binary)
+
+    for records in prefetch_batches(lambda size: list(islice(rows, size)), new_batch_size(), stats.record_fetch):
+        process_batch(records, packages_list, processor, stats)
+
+    return packages_list
+
+def fetch_with_engine(conn, engine : str, query : str, params : tuple, column_types : tuple, packages_list=None, processor=process_record, cursor_name="large_result_cursor", stats=None):
+    """
+    Runs the packages query with the selected ingest engine: "cursor", "copy-text" or "copy-binary".
+    All engines produce the same packages.
+    """
+
+    if engine == "cursor":
+        cursor = conn.cursor(name=cursor_name)
+        packages_list = fetch_records(cursor, query, params, packages_list, processor, stats)
+        cursor.close()
+        return packages_list
+
+    return fetch_records_copy(conn, query, params, column_types, packages_list, processor, binary=(engine == "copy-binary"), stats=stats)
+
+def replay_rows(cache_file : str, packages_list=None, processor=process_record):
+    """
+    Same as fetch_records, but reads the rows recorded with --row-cache record instead of querying Postgres.
+    Any processor matching the recorded query works, e.g. process_record_o to compare with the old logic.
+
+    Returns:
+    - packages_list, with processed package dicts appended in the order the rows were recorded.
+    """
+
+    if packages_list is None:
+        packages_list = []
+
+    chunks = read_row_cache(cache_file)
+
+    while True:
+        started = time.perf_counter()
+        records = next(chunks, [])
+        metrics.record_fetch(len(records), time.perf_counter() - started)
+
+        if not records:
+            break
+        process_batch(records, packages_list, processor)
+
+    return packages_list
+
+def fetch_id_range(task : tuple) -> list:
+    """
+    Worker entry point. Extracts one id range of an ecosystem over its own connection.
+
+    Parameters:
+    - task (tuple): (ecosystem, filter_count, low_id, high_id, projected, engine). Both id bounds are inclusive.
+
+    Returns:
+    - (packages_list, metrics_snapshot) (tuple): Processed package dicts for that range, only deduplicated
+      within the worker, and the worker's metrics for the parent to merge.
+    """
+
+    # The parent checks the shared store, the worker only needs a local one
+    global unique_urls, metrics
+    unique_urls = MemoryDedupeStore()
+    metrics = ExtractionMetrics(f"{task[0]}[{task[2]}-{task[3]}]", interval=None)
+
+    ecosystem, filter_count, low_id, high_id, projected, engine = task
+    query, processor, column_types = select_query(projected)
+
+    conn = psycopg2.connect(**db_credentials)
+
+    query += " AND id BETWEEN %s AND %s"
+    packages_list = fetch_with_engine(conn, engine, query, (ecosystem, filter_count, low_id, high_id), column_types,
+                                      processor=processor, cursor_name=f"large_result_cursor_{low_id}")
+
+    conn.close()
+    return packages_list, metrics.snapshot()
 
+def fetch_parallel(ecosystem : str, filter_count : int, workers : int, packages_list=None, projected=False, engine="cursor"):
+    """
+    Extracts an ecosystem by splitting the packages table into id ranges, one per worker process.
+
+    Workers deduplicate locally. Their results are merged in id order and checked against
+    `unique_urls` on `package_repo`, so the global dedupe still holds.
+
+    Returns:
+    - packages_list (a new list if not given), with the processed package dicts appended.
+    """
+
+    if packages_list is None:
+        packages_list = []
+
+    min_id, max_id = get_id_bounds(ecosystem, filter_count)
+    if min_id is None:
+        return packages_list
+
+    tasks = [(ecosystem, filter_count, low, high, projected, engine) for low, high in split_id_range(min_id, max_id, workers)]
+    unique_urls.flush()
+
+    with Pool(processes=workers) as pool:
+        for partition, worker_metrics in pool.imap(fetch_id_range, tasks):
+            metrics.merge(worker_metrics)
+
+            # Packages are only emitted once they pass the global dedupe
+            started = time.perf_counter()
+            emitted = []
+            for package in partition:
+                if package["package_repo"] not in unique_urls:
+                    unique_urls.add(package["package_repo"])
+                    emitted.append(package)
+                else:
+                    metrics.drop("duplicate")
+
+            appended = time.perf_counter()
+            for package in emitted:
+                packages_list.append(package)
+            metrics.record_process(appended - started, len(emitted))
+            metrics.record_sink(time.perf_counter() - appended)
+            metrics.maybe_report()
+
+    return packages_list
+
+def start_metrics(name : str) -> ExtractionMetrics:
+    global metrics
+    metrics = ExtractionMetrics(name, metrics_interval)
+    return metrics
+
+def finish_metrics():
+    """
+    Logs the final counters of the current extraction and writes them to logs/<name>_metrics.json.
+    """
+
+    metrics.report()
+
+    os.makedirs("logs", exist_ok=True)
+    summary_file = f"logs/{metrics.name}_metrics.json"
+    metrics.write_summary(summary_file)
+    print (f"Metrics written to {summary_file}")
+
+def get_output_file(ecosystem : str, filter_count : int, output_format="ndjson") -> str:
+    return f"extracted/{ecosystem}_packages_{filter_count}_tempy{output_suffix}" + format_extensions[output_format]
+
+def partial_output_file(output_file : str) -> str:
+    # Same extension as the real output, so package_io picks the same format
+    directory, filename = os.path.split(output_file)
+    return os.path.join(directory, f"partial_{filename}")
+
+def new_sink(output_file : str, sort_buffer_mb=None):
+    """
+    Returns:
+    - The packages sink for output_file: an ExternalSortWriter to its partial file when sort_buffer_mb
+      is set, a list otherwise. Hand it to finish_output once every package is in.
+    """
+
+    if sort_buffer_mb:
+        return ExternalSortWriter(partial_output_file(output_file), sort_buffer_mb * 1024 * 1024)
+    return []
+
+def finish_output(sink, output_file : str, seen, exclude=None) -> int:
+    """
+    Writes the packages of a sink from new_sink sorted under a temporary name, moves the file into
+    place, and only then commits the repos staged in seen, so a persistent dedupe store never holds
+    repos that are in no output file.
+
+    Parameters:
+    - seen (StagedDedupeStore): Store the sink's repos were staged in.
+    - exclude (set, optional): package_repo values to leave out of the output.
+
+    Returns:
+    - count (int): Number of packages written.
+    """
+
+    temp_file = partial_output_file(output_file)
+
+    if isinstance(sink, ExternalSortWriter):
+        count = sink.finish(exclude=exclude)
+    else:
+        if exclude:
+            sink = [package for package in sink if package["package_repo"] not in exclude]
+        count = write_sorted(sink, temp_file)
+
+    os.replace(temp_file, output_file)
+    seen.commit()
+    return count
+
+def write_sorted(packages_list : list, output_file : str) -> int:
+    """
+    Sorts packages by downloads (descending) and writes them out. The format follows the
+    extension of output_file, see package_io.
+
+    Returns:
+    - count (int): Number of packages written.
+    """
+
+    # Sort isn't necessary, but helps with running diff
+    packages_list = sorted(packages_list, key=lambda package: package["downloads"], reverse=True) 
+
+    return write_packages(packages_list, output_file)
+
+def load_checkpoints() -> dict:
+    if not os.path.exists(checkpoint_file):
+        return {}
+
+    with open(checkpoint_file) as f:
+        return json.load(f)
+
+def save_checkpoint(ecosystem : str, filter_count : int, column : str, value):
+    """
+    Stores the watermark of the last extraction for (ecosystem, filter_count). The file is replaced atomically.
+    """
+
+    checkpoints = load_checkpoints()
+    checkpoints[f"{ecosystem}_{filter_count}"] = {"column": column, "value": value}
+
+    temp_file = checkpoint_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(checkpoints, f, indent=4, default=str)
+    os.replace(temp_file, checkpoint_file)
+
+def get_watermark(ecosystem : str, filter_count : int, column : str):
+    """
+    Retrieves the current maximum of the checkpoint column for packages matching the filter.
+    """
+
+    conn = psycopg2.connect(**db_credentials)
+    cursor = conn.cursor()
+
+    cursor.execute(f"SELECT MAX({column}) FROM packages WHERE ecosystem = %s AND downloads >= %s;", (ecosystem, filter_count))
+    watermark = cursor.fetchone()[0]
+
+    cursor.close()
+    conn.close()
+    return watermark
+
+def process_ecosystem_incremental(ecosystem : str, filter_count=10, checkpoint_column="id", projected=False, engine="cursor", output_format="ndjson"):
+    """
+    Fetches only the packages past the stored checkpoint and merges them into the existing output file.
+
+    Packages already in the file are replaced by their updated version, keyed on `package_repo`.
+    Falls back to a full extraction when there is no checkpoint or no existing output.
+
+    Parameters:
+    - ecosystem (str): The ecosystem to be processed.
+    - filter_count (int, optional): The minimum number of downloads required to process a package.
+    - checkpoint_column (str, optional): Monotonic column used as watermark. "id" only picks up new rows,
+      "updated_at" also picks up changed rows.
+    - projected (bool, optional): Use the server-side projection query.
+    - engine (str, optional): Ingest engine, "cursor", "copy-text" or "copy-binary".
+    - output_format (str, optional): "ndjson", "gzip", "zstd" or "parquet".
 
-def process_ecosystem(ecosystem : str, filter_count=10, display_db_size=False):
+    Side effects:
+    - Rewrites the output file and updates the checkpoint file.
+    """
+
+    if checkpoint_column not in ("id", "updated_at"):
+        raise ValueError(f"Unsupported checkpoint column: {checkpoint_column}")
+
+    print (f"Processing {ecosystem} incrementally...")
+    start_metrics(f"{ecosystem}_{filter_count}_incremental")
+
+    output_file = get_output_file(ecosystem, filter_count, output_format)
+    checkpoint = load_checkpoints().get(f"{ecosystem}_{filter_count}")
+
+    existing = {}
+    if checkpoint and checkpoint["column"] == checkpoint_column and os.path.exists(output_file):
+        for package in read_packages(output_file):
+            existing[package["package_repo"]] = package
+        last_value = checkpoint["value"]
+    else:
+        last_value = None
+
+    # Capture the watermark first so rows written during the fetch are picked up by the next run
+    watermark = get_watermark(ecosystem, filter_count, checkpoint_column)
+
+    query, processor, column_types = select_query(projected)
+    query += f" AND {checkpoint_column} <= %s"
+    params = (ecosystem, filter_count, watermark)
+    if last_value is not None:
+        query += f" AND {checkpoint_column} > %s"
+        params += (last_value,)
+
+    conn = psycopg2.connect(**db_credentials)
+    delta = fetch_with_engine(conn, engine, query, params, column_types, processor=processor) if watermark is not None else []
+    conn.close()
+
+    for package in delta:
+        existing[package["package_repo"]] = package
+    unique_urls.update(existing)
+
+    out_pkg_cnt = finish_output(list(existing.values()), output_file, unique_urls)
+
+    if watermark is not None:
+        save_checkpoint(ecosystem, filter_count, checkpoint_column, watermark)
+
+    print (f"Merged {len(delta)} new or updated items. Dumped {out_pkg_cnt} items to {output_file}")
+    finish_metrics()
+
+def process_ecosystem(ecosystem : str, filter_count=10, display_db_size=False, workers=1, sort_buffer_mb=None, projected=False, engine="cursor", output_format="ndjson", row_cache=None):
     """
     Processes packages in a given ecosystem from the database based on filters and display options.
 
@@ -209,61 +861,233 @@ def process_ecosystem(ecosystem : str, filter_count=10, display_db_size=False):
     - ecosystem (str): The ecosystem to be processed.
     - filter_count (int, optional): The minimum number of downloads required to process a package.
     - display_db_size (bool, optional): Flag to display the total number of packages in the ecosystem.
+    - workers (int, optional): Number of worker processes. Values above 1 split the query into id ranges.
+    - sort_buffer_mb (int, optional): If set, stream records through an external sort that holds at most
+      this many MB of records in memory, instead of sorting the whole list in memory.
+    - projected (bool, optional): Extract only the needed repo_metadata keys in SQL and drop rows without
+      a usable repository URL server-side.
+    - engine (str, optional): Ingest engine. "cursor" uses a named cursor, "copy-text" and "copy-binary"
+      stream the rows through COPY TO STDOUT.
+    - output_format (str, optional): "ndjson", "gzip" or "zstd" (compressed NDJSON), or "parquet".
+    - row_cache (str, optional): "record" saves the raw rows to a cache file in row_cache_dir while fetching.
+      "replay" processes the cached rows instead of querying Postgres. Only with workers=1.
 
     Side effects:
-    - Writes processed package information into a .ndjson file.
+    - Writes processed package information into an output file of the chosen format.
     """
 
     print (f"Processing {ecosystem}...")
+    start_metrics(f"{ecosystem}_{filter_count}")
 
-    conn = psycopg2.connect(**db_credentials)
-    cursor = conn.cursor(name="large_result_cursor")
+    output_file = get_output_file(ecosystem, filter_count, output_format)
+    packages_list = new_sink(output_file, sort_buffer_mb)
 
-    output_file = f"extracted/{ecosystem}_packages_{filter_count}_tempy.ndjson"
-    packages_list = []
+    query, processor, column_types = select_query(projected)
+    cache_file = cache_path(row_cache_dir, ecosystem, filter_count, projected)
 
-    query = """
-        SELECT 
-            id, registry_id, name, ecosystem, licenses,
-            repository_url, homepage, normalized_licenses, repo_metadata, downloads
-        FROM 
-            packages
-        WHERE 
-            ecosystem = %s AND downloads >= %s;
+    if row_cache == "replay":
+        replay_rows(cache_file, packages_list, processor)
+    elif workers > 1:
+        fetch_parallel(ecosystem, filter_count, workers, packages_list, projected, engine)
+    else:
+        conn = psycopg2.connect(**db_credentials)
+
+        recorder = RowCacheWriter(cache_file) if row_cache == "record" else None
+        if recorder:
+            processor = recorder.recording(processor)
+
+        fetch_with_engine(conn, engine, query, (ecosystem, filter_count), column_types, packages_list, processor)
+
+        conn.close()
+
+        if recorder:
+            print (f"Recorded {recorder.close()} rows to {cache_file}")
+
+    out_pkg_cnt = finish_output(packages_list, output_file, unique_urls)
+
+    print (f"Dumped {out_pkg_cnt} items to {output_file}")
+
+    finish_metrics()
+
+    if display_db_size:
+        pkg_count = get_total_package_count(ecosystem)
+        print (f"{ecosystem} database has {pkg_count} packages. Filtered out {pkg_count - out_pkg_cnt} packages")
+
+def process_ecosystem_resumable(ecosystem : str, filter_count=10, display_db_size=False, sort_buffer_mb=None, projected=False, engine="cursor", output_format="ndjson", segment_rows=50000):
     """
+    Same as process_ecosystem, but survives a crash: rows are fetched in id order and processed packages
+    are written to segments under resume_dir as they come, see ResumableExtraction. Running it again after
+    a failure continues after the last recorded id instead of starting over.
 
-    # Query returns list. Each field is a list item in-order. 
-    # So, id field is record[0], registry_id is record[1], name is record[2] and so on
+    Once every row is processed, the segments are sorted into the usual output file, written under a
+    temporary name and moved into place, and the resume state is removed.
 
-    cursor.execute(query, (ecosystem, filter_count))
-    records = list(cursor.fetchmany(1000))
+    Parameters:
+    - segment_rows (int, optional): Rows processed per write-ahead segment.
+    - Others: See process_ecosystem.
 
-    while records:
-        for record in records:
-            package_info = process_record(record)
-            if package_info:
-                packages_list.append(package_info)
+    Side effects:
+    - Writes processed package information into an output file of the chosen format.
+    """
 
-        records = list(cursor.fetchmany(1000))
+    print (f"Processing {ecosystem} resumably...")
+    start_metrics(f"{ecosystem}_{filter_count}")
 
-    # Sort isn't necessary, but helps with running diff
-    packages_list = sorted(packages_list, key=lambda package: package["downloads"], reverse=True) 
+    state_dir = os.path.join(resume_dir, f"{ecosystem}_{filter_count}" + ("_projected" if projected else ""))
+    extraction = ResumableExtraction(state_dir, unique_urls, segment_rows)
 
-    with open(output_file, "w") as f:
-        for package in packages_list:
-            json.dump(package, f)
-            f.write('\n')
+    query, processor, column_types = select_query(projected)
+    params = (ecosystem, filter_count)
+    if extraction.resumed:
+        print (f"Resuming after id {extraction.last_id}, {extraction.state['rows']} rows already processed")
+        query += " AND id > %s"
+        params += (extraction.last_id,)
+    query += " ORDER BY id"
 
-    out_pkg_cnt = len(packages_list)
+    processor = extraction.tracking(partial(processor, seen=extraction.seen))
+
+    conn = psycopg2.connect(**db_credentials)
+    fetch_with_engine(conn, engine, query, params, column_types, extraction, processor)
+    conn.close()
+
+    extraction.commit()
+
+    # Finalize: the segments are only discarded once the output is in place
+    output_file = get_output_file(ecosystem, filter_count, output_format)
+    packages_list = new_sink(output_file, sort_buffer_mb)
+    for package in extraction.packages():
+        packages_list.append(package)
+
+    out_pkg_cnt = finish_output(packages_list, output_file, unique_urls)
+    extraction.discard()
 
     print (f"Dumped {out_pkg_cnt} items to {output_file}")
 
+    finish_metrics()
+
     if display_db_size:
         pkg_count = get_total_package_count(ecosystem)
         print (f"{ecosystem} database has {pkg_count} packages. Filtered out {pkg_count - out_pkg_cnt} packages")
 
-    cursor.close()
+def process_ecosystem_thresholds(ecosystem : str, filter_counts : list, stores : dict, display_db_size=False, sort_buffer_mb=None, projected=False, engine="cursor", output_format="ndjson"):
+    """
+    Processes an ecosystem for several download thresholds with a single scan of the packages table.
+
+    The query runs once at the lowest threshold and rows are processed without deduplication. Each
+    package then goes to the output of every threshold it meets, deduplicated in that threshold's own
+    store, so every output is the same as a separate process_ecosystem run at that threshold.
+
+    Parameters:
+    - ecosystem (str): The ecosystem to be processed.
+    - filter_counts (list): Minimum numbers of downloads, one output file each.
+    - stores (dict): threshold -> StagedDedupeStore, shared by the ecosystems of one run like `unique_urls`.
+    - display_db_size, sort_buffer_mb, projected, engine, output_format: See process_ecosystem.
+
+    Side effects:
+    - Writes one output file per threshold.
+    """
+
+    print (f"Processing {ecosystem}...")
+    filter_counts = sorted(filter_counts)
+    start_metrics(f"{ecosystem}_" + "_".join(map(str, filter_counts)))
+
+    output_files = {threshold: get_output_file(ecosystem, threshold, output_format) for threshold in filter_counts}
+    sinks = {threshold: new_sink(output_files[threshold], sort_buffer_mb) for threshold in filter_counts}
+
+    query, processor, column_types = select_query(projected)
+    processor = partial(processor, seen=NullDedupeStore())
+
+    conn = psycopg2.connect(**db_credentials)
+    fetch_with_engine(conn, engine, query, (ecosystem, filter_counts[0]), column_types, ThresholdSplitter(sinks, stores), processor)
     conn.close()
 
+    out_pkg_cnts = {}
+    for threshold in filter_counts:
+        out_pkg_cnts[threshold] = finish_output(sinks[threshold], output_files[threshold], stores[threshold])
+        print (f"Dumped {out_pkg_cnts[threshold]} items to {output_files[threshold]}")
+
+    finish_metrics()
+
+    if display_db_size:
+        pkg_count = get_total_package_count(ecosystem)
+        for threshold in filter_counts:
+            print (f"{ecosystem} database has {pkg_count} packages. Filtered out {pkg_count - out_pkg_cnts[threshold]} packages at {threshold} downloads")
+
+def extract_from_pool(pool, ecosystem : str, filter_count : int, packages_list, projected=False, engine="cursor") -> tuple:
+    """
+    Extracts one ecosystem over a pooled connection into packages_list. Deduplicates only within
+    the ecosystem and counts into its own metrics, so several ecosystems can run in parallel
+    threads without sharing any state.
+
+    Returns:
+    - (seen, metrics_snapshot) (tuple): The repositories emitted for the ecosystem, and its metrics
+      for the caller to merge.
+    """
+
+    seen = MemoryDedupeStore()
+    stats = ExtractionMetrics(f"{ecosystem}_{filter_count}", metrics_interval)
+
+    query, processor, column_types = select_query(projected)
+    processor = partial(processor, seen=seen, stats=stats)
+
+    conn = pool.getconn()
+    try:
+        fetch_with_engine(conn, engine, query, (ecosystem, filter_count), column_types, packages_list,
+                          processor, cursor_name=f"large_result_cursor_{ecosystem}", stats=stats)
+    finally:
+        pool.putconn(conn)
+
+    return seen, stats.snapshot()
+
+def process_ecosystems_concurrently(ecosystems : list, filter_count=10, display_db_size=False, sort_buffer_mb=None, projected=False, engine="cursor", output_format="ndjson"):
+    """
+    Processes several ecosystems at the same time, one thread each, over a shared connection pool.
+    With display_db_size, the count queries run alongside the extractions.
+
+    Each thread streams its ecosystem into the ecosystem's own writer, deduplicated within the
+    ecosystem. Once it is done, the repositories it emitted are checked against `unique_urls` in the
+    given ecosystem order and those already emitted by an earlier ecosystem are left out as the
+    writer finishes, so the outputs are the same as running the ecosystems one after another.
+
+    Side effects:
+    - Writes one output file per ecosystem.
+    """
+
+    for ecosystem in ecosystems:
+        print (f"Processing {ecosystem}...")
+    start_metrics("_".join(ecosystems) + f"_{filter_count}")
+
+    output_files = {ecosystem: get_output_file(ecosystem, filter_count, output_format) for ecosystem in ecosystems}
+    sinks = {ecosystem: new_sink(output_files[ecosystem], sort_buffer_mb) for ecosystem in ecosystems}
+
+    jobs = len(ecosystems) * (2 if display_db_size else 1)
+    pool = ThreadedConnectionPool(1, jobs, **db_credentials)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        extractions = {ecosystem: executor.submit(extract_from_pool, pool, ecosystem, filter_count, sinks[ecosystem], projected, engine) for ecosystem in ecosystems}
+        counts = {ecosystem: executor.submit(get_total_package_count, ecosystem, pool) for ecosystem in ecosystems} if display_db_size else {}
+
+        for ecosystem in ecosystems:
+            seen, ecosystem_metrics = extractions[ecosystem].result()
+            metrics.merge(ecosystem_metrics)
+
+            started = time.perf_counter()
+            duplicates = {package_repo for package_repo in seen if package_repo in unique_urls}
+            unique_urls.update(seen)
+            metrics.drop("duplicate", len(duplicates))
+            metrics.record_process(time.perf_counter() - started, len(seen) - len(duplicates))
+
+            # The ecosystem's repos are staged in unique_urls until its output is written
+            out_pkg_cnt = finish_output(sinks[ecosystem], output_files[ecosystem], unique_urls, exclude=duplicates)
+
+            print (f"Dumped {out_pkg_cnt} items to {output_files[ecosystem]}")
+
+            if display_db_size:
+                pkg_count = counts[ecosystem].result()
+                print (f"{ecosystem} database has {pkg_count} packages. Filtered out {pkg_count - out_pkg_cnt} packages")
+
+    pool.closeall()
+    finish_metrics()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+#! /usr/bin/python3
+
+## Micro-benchmark of the JSON backends behind ndjson_codec on the record shapes this repo reads and writes:
+## extracted package records and regex usage traces (ndjson_printer input).
+##
+## Example Usage ./bench_ndjson_codec.py --records 100000
+##               ./bench_ndjson_codec.py --input ../extracted/npm_packages_10.ndjson
+
+import os, sys, random, argparse, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import ndjson_codec as codec
+
+licenses = ["MIT", "Apache-2.0", "BSD-3-Clause", "ISC", None, [{"type": "MIT"}], {"type": "GPL-3.0", "url": "https://www.gnu.org/licenses/gpl-3.0"}]
+
+def make_package(rng : random.Random, i : int) -> dict:
+    owner = f"owner{rng.randrange(5000)}"
+    return {
+        "package_repo": f"https://github.com/{owner}/pkg{i}",
+        "package_name": f"pkg{i}",
+        "repo_owner": owner,
+        "package_ecosystem": rng.choice(["npm", "pypi", "maven"]),
+        "package_licenses": rng.choice(licenses),
+        "package_language": rng.choice(["JavaScript", "TypeScript", "Python", "Java", None]),
+        "package_starcount": rng.randrange(100000),
+        "downloads": rng.randrange(10**9),
+    }
+
+def make_trace(rng : random.Random, i : int) -> dict:
+    usages = []
+    for u in range(rng.randrange(1, 8)):
+        entries = [{
+            "caller": {"object": rng.choice(["RegExp", "String", "Object"]), "method": rng.choice(["exec", "test", "match", "replace"])},
+            "file_info": {"file_path": rng.choice([f"src/lib/file{i % 300}.js", f"node_modules/dep{u}/index.js"]), "line": rng.randrange(1, 2000), "column": rng.randrange(1, 120)},
+        } for _ in range(rng.randrange(1, 6))]
+        usages.append({"subject": f"input string {rng.randrange(1000)} é ü", "stack": {"entries": entries}})
+    return {"pattern": f"^(?:[a-z]+)\\d{{{i % 10}}}$", "project_repo_url": f"https://github.com/owner/project{i % 50}", "usages": usages}
+
+def read_lines(file_path : str, limit : int) -> list:
+    with open(file_path) as f:
+        return [line for line, _ in zip(f, range(limit))]
+
+def time_per_record(function, items : list) -> float:
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items) * 1e9
+
+def typed_package_decoder():
+    """
+    msgspec decoding straight into a typed struct, the fastest option when the schema is fixed.
+    Returns None when msgspec is not installed.
+    """
+
+    if codec.msgspec is None:
+        return None
+
+    msgspec = codec.msgspec
+
+    class PackageRecord(msgspec.Struct):
+        package_repo: str
+        package_name: str
+        repo_owner: str
+        package_ecosystem: str
+        package_licenses: object
+        package_language: object
+        package_starcount: object
+        downloads: int
+
+    return msgspec.json.Decoder(PackageRecord).decode
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NDJSON decode per record for each installed JSON backend, and encode.")
+    parser.add_argument("--records", type=int, default=100000, help="Number of synthetic records per shape.")
+    parser.add_argument("--input", action="append", default=[], help="Real NDJSON file to decode (repeatable). Only the first --records lines are used.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic record generator.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    shapes = {
+        "package": [make_package(rng, i) for i in range(args.records)],
+        "usage trace": [make_trace(rng, i) for i in range(args.records)],
+    }
+
+    reference_loads, reference_dumps = codec.make_codec("json")
+    lines = {name: [reference_dumps(record) for record in records] for name, records in shapes.items()}
+    for file_path in args.input:
+        lines[os.path.basename(file_path)] = read_lines(file_path, args.records)
+
+    print(f"backends: {', '.join(codec.available_backends())} (default: {codec.backend})")
+    # dumps is the json module's whatever the backend, see ndjson_codec.make_codec
+    for name, records in shapes.items():
+        print(f"{'json':8} dumps {name:24} {time_per_record(reference_dumps, records):8.1f} ns/record")
+        print(f"{'json':8} dumps {name + ' (sorted)':24} {time_per_record(lambda record: reference_dumps(record, sort_keys=True), records):8.1f} ns/record")
+    for backend in codec.available_backends():
+        loads, dumps = codec.make_codec(backend)
+        for name, records in lines.items():
+            print(f"{backend:8} loads {name:24} {time_per_record(loads, records):8.1f} ns/record")
+
+    decode = typed_package_decoder()
+    if decode is not None:
+        print(f"{'msgspec':8} loads {'package (typed struct)':24} {time_per_record(decode, lines['package']):8.1f} ns/record")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#! /usr/bin/python3
+
+## Benchmarks the extraction pipeline stage by stage on synthetic rows, no database needed:
+## process_record, process_record_o, process_record_projected, the dedupe stores, sorting, writing
+## each output format, and a full process_ecosystem run over a fake connection.
+## Results are written as JSON to track regressions across commits.
+##
+## Example Usage ./bench_pipeline.py --rows 200000 --output results/baseline.json
+
+import os, sys, json, time, argparse, platform, tempfile, contextlib, io
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import PSQL_Extractor as extractor
+import ndjson_codec as codec
+from dedupe_store import MemoryDedupeStore, SqliteDedupeStore, StagedDedupeStore
+from external_sort import ExternalSortWriter
+from package_io import format_extensions, write_packages, zstandard, pq
+from synthetic import make_rows, project_row, fake_connect
+
+def best_of(function, repeat : int) -> float:
+    """
+    Returns:
+    - The fastest of `repeat` runs, in seconds.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def result(seconds : float, rows : int) -> dict:
+    return {"seconds": round(seconds, 4), "rows": rows, "rows_per_second": round(rows / seconds, 1) if seconds else None}
+
+def bench_processors(rows : list, repeat : int) -> dict:
+    projected_rows = [projected for projected in map(project_row, rows) if projected is not None]
+
+    def run_process_record():
+        seen = MemoryDedupeStore()
+        for row in rows:
+            extractor.process_record(row, seen)
+
+    def run_process_record_o():
+        # The old version only dedupes against the global store
+        extractor.unique_urls = MemoryDedupeStore()
+        for row in rows:
+            extractor.process_record_o(row)
+
+    def run_process_record_projected():
+        seen = MemoryDedupeStore()
+        for row in projected_rows:
+            extractor.process_record_projected(row, seen)
+
+    return {
+        "process_record": result(best_of(run_process_record, repeat), len(rows)),
+        "process_record_o": result(best_of(run_process_record_o, repeat), len(rows)),
+        "process_record_projected": result(best_of(run_process_record_projected, repeat), len(projected_rows)),
+    }
+
+def bench_dedupe(keys : list, repeat : int, temp_dir : str) -> dict:
+    def run(make_store):
+        def dedupe():
+            store = make_store()
+            for key in keys:
+                if key not in store:
+                    store.add(key)
+            store.close()
+        return dedupe
+
+    def sqlite_store():
+        path = os.path.join(temp_dir, "bench_seen.sqlite")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return SqliteDedupeStore(path)
+
+    return {
+        "dedupe_memory": result(best_of(run(MemoryDedupeStore), repeat), len(keys)),
+        "dedupe_sqlite": result(best_of(run(sqlite_store), repeat), len(keys)),
+    }
+
+def bench_sort(packages : list, repeat : int, temp_dir : str) -> dict:
+    output_file = os.path.join(temp_dir, "bench_sorted.ndjson")
+    buffer_bytes = max(sum(len(codec.dumps(package)) for package in packages) // 8, 1)
+
+    def external_sort():
+        writer = ExternalSortWriter(output_file, buffer_bytes, temp_dir)
+        for package in packages:
+            writer.append(package)
+        writer.finish()
+
+    return {
+        "sort_memory": result(best_of(lambda: sorted(packages, key=lambda package: package["downloads"], reverse=True), repeat), len(packages)),
+        "sort_external_8_runs_and_write": result(best_of(external_sort, repeat), len(packages)),
+    }
+
+def bench_write(packages : list, repeat : int, temp_dir : str) -> dict:
+    available = {"ndjson": True, "gzip": True, "zstd": zstandard is not None, "parquet": pq is not None}
+    results = {}
+
+    for output_format, extension in format_extensions.items():
+        if not available[output_format]:
+            continue
+        output_file = os.path.join(temp_dir, "bench_write" + extension)
+        results[f"write_{output_format}"] = result(best_of(lambda: write_packages(packages, output_file), repeat), len(packages))
+        results[f"write_{output_format}"]["bytes"] = os.path.getsize(output_file)
+
+    return results
+
+def bench_end_to_end(rows : list, repeat : int, temp_dir : str) -> dict:
+    """
+    Full process_ecosystem runs (fetch, process, dedupe, sort, write) over a fake connection.
+    """
+
+    extractor.psycopg2.connect = fake_connect(rows)
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(temp_dir)
+    os.makedirs("extracted", exist_ok=True)
+
+    try:
+        for ecosystem in sorted({row[3] for row in rows}):
+            count = sum(1 for row in rows if row[3] == ecosystem)
+            for projected in (False, True):
+                def run():
+                    extractor.unique_urls = StagedDedupeStore(MemoryDedupeStore())
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        extractor.process_ecosystem(ecosystem, filter_count=0, projected=projected)
+                name = f"process_ecosystem_{ecosystem}" + ("_projected" if projected else "")
+                results[name] = result(best_of(run, repeat), count)
+    finally:
+        os.chdir(cwd)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline on synthetic rows and write the results as JSON.")
+    parser.add_argument("--rows", type=int, default=200000, help="Number of synthetic packages rows.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the row generator.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.15, help="Share of rows reusing an earlier repository.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the fastest is kept.")
+    parser.add_argument("--output", default=None, help="JSON results file. Defaults to results/pipeline_<timestamp>.json next to this script.")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.seed, args.duplicate_rate)
+
+    seen = MemoryDedupeStore()
+    packages = [package for package in (extractor.process_record(row, seen) for row in rows) if package]
+
+    # Every parsable repository URL, duplicates included, as the dedupe stores see them
+    urls = (row[5] or row[6] for row in rows)
+    keys = [extractor.canonical_repo_url(*parts) for url in urls if url and (parts := extractor.parse_repo_url(url))]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results.update(bench_processors(rows, args.repeat))
+        results.update(bench_dedupe(keys, args.repeat, temp_dir))
+        results.update(bench_sort(packages, args.repeat, temp_dir))
+        results.update(bench_write(packages, args.repeat, temp_dir))
+        results.update(bench_end_to_end(rows, args.repeat, temp_dir))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "json_backend": codec.backend,
+        "rows": args.rows,
+        "seed": args.seed,
+        "duplicate_rate": args.duplicate_rate,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    output_file = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                              f"pipeline_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=4)
+
+    for name, timing in results.items():
+        print(f"{name:40} {timing['rows_per_second']:>12} rows/s")
+    print(f"Results written to {output_file}")
+
+if __name__ == "__main__":
+    main()
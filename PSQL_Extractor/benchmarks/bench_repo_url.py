@@ -0,0 +1,60 @@
+#! /usr/bin/python3
+
+## Micro-benchmark of per-record repository URL parsing cost.
+##
+## Example Usage ./bench_repo_url.py --records 200000 --distinct 50000
+
+import os, sys, re, random, argparse, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from repo_url import parse_repo_url, canonicalize_repo_url
+
+url_forms = [
+    "https://github.com/{owner}/{name}",
+    "https://github.com/{owner}/{name}.git",
+    "git+https://github.com/{owner}/{name}.git",
+    "git@github.com:{owner}/{name}.git",
+    "https://www.GitHub.com/{owner}/{name}/",
+    "https://gitlab.com/{owner}/{name}/tree/main",
+    "https://example.com/{owner}/{name}",
+]
+
+def make_urls(records : int, distinct : int, seed=0) -> list:
+    rng = random.Random(seed)
+    pool = [rng.choice(url_forms).format(owner=f"owner{i % 5000}", name=f"pkg{i}") for i in range(distinct)]
+    return [rng.choice(pool) for _ in range(records)]
+
+def legacy_parse(url : str):
+    match = re.match(r"https?://(?:www\.)?(github|gitlab)\.com/([^/]+)/([^/]+)", url)
+    return (match.group(1), match.group(2), match.group(3)) if match else None
+
+def time_per_record(function, urls : list) -> float:
+    start = time.perf_counter()
+    for url in urls:
+        function(url)
+    return (time.perf_counter() - start) / len(urls) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repository URL parsing per record.")
+    parser.add_argument("--records", type=int, default=200000, help="Number of URLs parsed per run.")
+    parser.add_argument("--distinct", type=int, default=50000, help="Number of distinct URLs among them.")
+    args = parser.parse_args()
+
+    urls = make_urls(args.records, args.distinct)
+
+    results = {"legacy re.match": time_per_record(legacy_parse, urls)}
+
+    parse_repo_url.cache_clear()
+    results["parse_repo_url (cold cache)"] = time_per_record(parse_repo_url, urls)
+    results["parse_repo_url (warm cache)"] = time_per_record(parse_repo_url, urls)
+
+    parse_repo_url.cache_clear()
+    canonicalize_repo_url.cache_clear()
+    results["canonicalize_repo_url (cold cache)"] = time_per_record(canonicalize_repo_url, urls)
+    results["canonicalize_repo_url (warm cache)"] = time_per_record(canonicalize_repo_url, urls)
+
+    for name, ns in results.items():
+        print(f"{name:40} {ns:8.1f} ns/record")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+## Seeded synthetic `packages` rows and a fake psycopg2 connection serving them, so the extraction
+## pipeline can be benchmarked and exercised without Postgres.
+
+import re, random
+
+ecosystems = ["npm", "pypi", "maven"]
+languages = ["JavaScript", "TypeScript", "Python", "Java", "Kotlin", "Scala", None]
+normalized_licenses = [["MIT"], ["Apache-2.0"], ["BSD-3-Clause"], ["MIT", "Apache-2.0"], ["Other"], []]
+
+# Repository URL forms seen in the registries, github and gitlab, with and without a usable repo path
+url_forms = [
+    "https://github.com/{owner}/{name}",
+    "https://github.com/{owner}/{name}.git",
+    "git+https://github.com/{owner}/{name}.git",
+    "git@github.com:{owner}/{name}.git",
+    "https://www.github.com/{owner}/{name}/tree/main",
+    "https://gitlab.com/{owner}/{name}",
+    "https://gitlab.com/{owner}/{name}.git",
+    "https://{name}.readthedocs.io",
+    "https://example.com/{owner}",
+]
+
+
+def make_metadata(rng : random.Random, owner : str, name : str) -> dict:
+    # The keys process_record reads, plus the bulk a real repo_metadata blob carries
+    return {
+        "full_name": f"{owner}/{name}",
+        "owner": owner,
+        "license": rng.choice(["mit", "apache-2.0", "bsd-3-clause", "gpl-3.0", None]),
+        "language": rng.choice(languages),
+        "stargazers_count": int(10 ** rng.uniform(0, 5)),
+        "description": " ".join(rng.choice(["fast", "tiny", "parser", "client", "for", "the", "web", "async"]) for _ in range(rng.randrange(3, 20))),
+        "topics": [rng.choice(["cli", "http", "json", "orm", "testing", "ml"]) for _ in range(rng.randrange(0, 6))],
+        "forks_count": rng.randrange(1000),
+        "open_issues_count": rng.randrange(300),
+        "default_branch": rng.choice(["main", "master"]),
+        "archived": rng.random() < 0.05,
+        "fork": rng.random() < 0.1,
+        "homepage": rng.choice([None, f"https://{name}.dev"]),
+        "pushed_at": f"2023-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}T00:00:00Z",
+    }
+
+
+def make_rows(count : int, seed=0, duplicate_rate=0.15, ecosystem=None) -> list:
+    """
+    Generates rows shaped like packages_query results:
+    (id, registry_id, name, ecosystem, licenses, repository_url, homepage, normalized_licenses, repo_metadata, downloads)
+
+    The mix covers what process_record has to handle: full repo_metadata, '{}' and NULL metadata,
+    github and gitlab URLs in several forms, URLs only in homepage, unusable or empty URLs, and
+    packages pointing at a repository already used by an earlier row.
+
+    Parameters:
+    - count (int): Number of rows.
+    - seed (int, optional): Same seed, same rows.
+    - duplicate_rate (float, optional): Share of rows reusing an earlier repository.
+    - ecosystem (str, optional): Ecosystem of every row. Mixed when omitted.
+
+    Returns:
+    - list of tuples, in ascending id order.
+    """
+
+    rng = random.Random(seed)
+    repos = []
+    rows = []
+
+    for i in range(1, count + 1):
+        if repos and rng.random() < duplicate_rate:
+            owner, name = rng.choice(repos)
+        else:
+            owner, name = f"owner{rng.randrange(count // 4 + 1)}", f"pkg{i}"
+            repos.append((owner, name))
+
+        url = rng.choice(url_forms).format(owner=owner, name=name)
+        kind = rng.random()
+        if kind < 0.55:
+            metadata = make_metadata(rng, owner, name)
+        elif kind < 0.9:
+            metadata = {}
+        else:
+            metadata = None
+
+        place = rng.random()
+        if place < 0.7:
+            repository_url, homepage = url, rng.choice([None, f"https://{name}.dev"])
+        elif place < 0.85:
+            repository_url, homepage = rng.choice([None, ""]), url
+        else:
+            repository_url, homepage = rng.choice([None, "", "  "]), None
+
+        rows.append((
+            i,
+            rng.randrange(1, 4),
+            name,
+            ecosystem or rng.choice(ecosystems),
+            rng.choice(["MIT", "Apache-2.0", "BSD-3-Clause", "ISC", None]),
+            repository_url,
+            homepage,
+            rng.choice(normalized_licenses),
+            metadata,
+            int(10 ** rng.uniform(0, 7)),
+        ))
+
+    return rows
+
+
+project_pattern = re.compile(r"(github|gitlab)\.com[:/]+[^/]+/[^/]+", re.IGNORECASE)
+
+def project_row(row : tuple):
+    """
+    Applies projected_query to one packages row in Python.
+
+    Returns:
+    - The projected row, or None if the query would filter it out.
+    """
+
+    repo_url = row[5] or row[6]
+    metadata = row[8]
+    has_metadata = bool(metadata)
+
+    if repo_url is None or not repo_url.strip():
+        return None
+    if not has_metadata and not project_pattern.search(repo_url):
+        return None
+
+    metadata = metadata or {}
+    return (row[0], row[3], row[4], row[7], repo_url, has_metadata, metadata.get("full_name"), metadata.get("owner"),
+            metadata.get("license"), metadata.get("language"), metadata.get("stargazers_count"), row[9])
+
+
+# Extra conditions the extractor appends to the packages queries, e.g. "AND id BETWEEN %s AND %s"
+condition_pattern = re.compile(r"AND (\w+) (<=|>=|<|>|BETWEEN) %s")
+
+class FakeCursor:
+    """
+    Stands in for a psycopg2 cursor (named or not) over a list of synthetic rows.
+
+    Understands the queries PSQL_Extractor runs: the packages and projected queries with their
+    ecosystem/downloads parameters and appended id conditions, COUNT(*), MIN(id)/MAX(id) and MAX(id).
+    """
+
+    def __init__(self, rows : list, name=None):
+        self.all_rows = rows
+        self.name = name
+        self.itersize = 2000
+        self.arraysize = 1
+        self.result = iter(())
+
+    def filter_rows(self, query : str, params : tuple) -> list:
+        ecosystem, params = params[0], list(params[1:])
+        rows = [row for row in self.all_rows if row[3] == ecosystem]
+
+        if "downloads >= %s" in query:
+            filter_count = params.pop(0)
+            rows = [row for row in rows if row[9] >= filter_count]
+
+        for column, operator in condition_pattern.findall(query.split("downloads >= %s", 1)[-1]):
+            if column != "id":
+                raise NotImplementedError(f"FakeCursor only filters on id, not {column}")
+            if operator == "BETWEEN":
+                low, high = params.pop(0), params.pop(0)
+                rows = [row for row in rows if low <= row[0] <= high]
+                continue
+            value = params.pop(0)
+            compare = {"<=": int.__le__, ">=": int.__ge__, "<": int.__lt__, ">": int.__gt__}[operator]
+            rows = [row for row in rows if compare(row[0], value)]
+
+        return rows
+
+    def execute(self, query : str, params=()):
+        rows = self.filter_rows(query, params)
+
+        if "COUNT(*)" in query:
+            result = [(len(rows),)]
+        elif "MIN(id), MAX(id)" in query:
+            result = [(rows[0][0], rows[-1][0]) if rows else (None, None)]
+        elif "MAX(id)" in query:
+            result = [(rows[-1][0] if rows else None,)]
+        elif "repo_url" in query:
+            result = [projected for projected in map(project_row, rows) if projected is not None]
+        else:
+            result = rows
+
+        self.result = iter(result)
+
+    def fetchone(self):
+        return next(self.result, None)
+
+    def fetchmany(self, size=None):
+        return [row for _, row in zip(range(size or self.arraysize), self.result)]
+
+    def fetchall(self):
+        return list(self.result)
+
+    def __iter__(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows : list):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCursor(self.rows, name)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def fake_connect(rows : list):
+    """
+    Returns:
+    - A replacement for psycopg2.connect serving `rows`, e.g. `PSQL_Extractor.psycopg2.connect = fake_connect(rows)`.
+    """
+
+    def connect(**credentials):
+        return FakeConnection(rows)
+    return connect
@@ -1,29 +1,29 @@
-import json
-import hashlib, sys, os
-
-def read_ndjson(file_path):
-    with open(file_path, 'r') as file:
-        return [json.loads(line) for line in file]
-
-def compare_ndjson(file1_path, file2_path, output_file1, output_file2):
-    # Function to read NDJSON file
-    def read_ndjson(file_path):
-        with open(file_path, 'r') as file:
-            return [json.loads(line) for line in file]
-
-    # Function to write NDJSON file
-    def write_ndjson(data, file_path):
-        with open(file_path, 'w') as file:
-            for entry in data:
-                file.write(json.dumps(entry) + '\n')
-
+import hashlib, os
+import argparse, tempfile, time, zlib
+from multiprocessing import Pool
+from contextlib import ExitStack
+from repo_url import canonicalize_repo_url
+import ndjson_codec as codec
+from package_io import read_packages, write_packages, write_lines
+from ndjson_reader import read_ndjson_parallel
+
+def repo_key(entry):
+    # Canonical form, so .git suffixes, trailing slashes and casing don't count as differences
+    return canonicalize_repo_url(entry['package_repo']) or entry['package_repo']
+
+# Both helpers handle plain, gzip/zstd compressed NDJSON and Parquet, see package_io
+def read_ndjson(file_path, jobs=None):
+    # Parsed in parallel chunks, in file order
+    return list(read_ndjson_parallel(file_path, jobs=jobs))
+
+def compare_ndjson(file1_path, file2_path, output_file1, output_file2, jobs=None):
     # Read the data from both files
-    file1_data = read_ndjson(file1_path)
-    file2_data = read_ndjson(file2_path)
+    file1_data = read_ndjson(file1_path, jobs)
+    file2_data = read_ndjson(file2_path, jobs)
 
     # Extract package_repo URLs and map them back to the original data entries
-    file1_urls = {entry['package_repo']: entry for entry in file1_data}
-    file2_urls = {entry['package_repo']: entry for entry in file2_data}
+    file1_urls = {repo_key(entry): entry for entry in file1_data}
+    file2_urls = {repo_key(entry): entry for entry in file2_data}
 
     # Find unique URLs
     unique_to_file1_urls = set(file1_urls.keys()) - set(file2_urls.keys())
@@ -39,6 +39,79 @@ def compare_ndjson(file1_path, file2_path, output_file1, output_file2):
     print(f"Unique entries written to {output_file1} and {output_file2}")
 
 
+def partition_file(file_path, partition_dir, partitions):
+    """
+    Spills a packages file into `partitions` files by hash of the canonical repo key.
+    Each line is `<json key>\t<json entry>`.
+
+    Returns the number of records read.
+    """
+
+    count = 0
+
+    # Closes every partition even when reading the input fails
+    with ExitStack() as stack:
+        outputs = [stack.enter_context(open(os.path.join(partition_dir, f"{i}.part"), 'w')) for i in range(partitions)]
+
+        for entry in read_packages(file_path):
+            key = codec.dumps(repo_key(entry))
+            outputs[zlib.crc32(key.encode('utf-8')) % partitions].write(f"{key}\t{codec.dumps(entry)}\n")
+            count += 1
+
+    return count
+
+
+def read_partition(partition_path):
+    # Later entries win, like the dicts in compare_ndjson
+    entries = {}
+    with open(partition_path) as file:
+        for line in file:
+            key, entry = line.rstrip('\n').split('\t', 1)
+            entries[key] = entry
+    return entries
+
+
+def read_partition_keys(partition_path):
+    # Only the keys, the entries after the tab are not kept
+    with open(partition_path) as file:
+        return {line.split('\t', 1)[0] for line in file}
+
+
+def unique_lines(partition_dir, other_dir, partitions):
+    # Entries of partition_dir whose key does not appear in the same partition of other_dir
+    for i in range(partitions):
+        entries = read_partition(os.path.join(partition_dir, f"{i}.part"))
+        other_keys = read_partition_keys(os.path.join(other_dir, f"{i}.part"))
+        for key, entry in entries.items():
+            if key not in other_keys:
+                yield entry
+
+
+def compare_ndjson_streaming(file1_path, file2_path, output_file1, output_file2, partitions=64, temp_dir=None):
+    """
+    Same result as compare_ndjson, for inputs that don't fit in memory.
+
+    Both files are hash-partitioned on the canonical repo key into temporary files, then each
+    partition pair is diffed on its own. Only one partition of each file is in memory at a time.
+    """
+
+    start = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as work_dir:
+        dir1, dir2 = os.path.join(work_dir, "1"), os.path.join(work_dir, "2")
+        os.mkdir(dir1)
+        os.mkdir(dir2)
+
+        count = partition_file(file1_path, dir1, partitions) + partition_file(file2_path, dir2, partitions)
+
+        write_lines(unique_lines(dir1, dir2, partitions), output_file1)
+        write_lines(unique_lines(dir2, dir1, partitions), output_file2)
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {count} records in {elapsed:.1f}s ({count / elapsed:.0f} records/s)")
+    print(f"Unique entries written to {output_file1} and {output_file2}")
+
+
 def modify_file_path(original_path, prefix):
     directory, filename = os.path.split(original_path)
     new_filename = f'{prefix}{filename}'
@@ -46,37 +119,129 @@ def modify_file_path(original_path, prefix):
 
 
 def hash_entry(entry):
-    return hashlib.md5(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()
+    return hashlib.md5(codec.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()
 
 def process_ndjson(file_path, existing_hashes=None):
     unique_entries = []
     unique_hashes = set()
     
-    with open(file_path, 'r') as file:
-        for line in file:
-            entry = json.loads(line)
-            entry_hash = hash_entry(entry)
-            # If we have a set to compare with and the hash is not in it, add to unique
-            if existing_hashes is not None and entry_hash not in existing_hashes:
-                unique_entries.append(entry)
-            # If there's no set to compare with, we're creating it
-            elif existing_hashes is None:
-                unique_hashes.add(entry_hash)
+    for entry in read_packages(file_path):
+        entry_hash = hash_entry(entry)
+        # If we have a set to compare with and the hash is not in it, add to unique
+        if existing_hashes is not None and entry_hash not in existing_hashes:
+            unique_entries.append(entry)
+        # If there's no set to compare with, we're creating it
+        elif existing_hashes is None:
+            unique_hashes.add(entry_hash)
     
     return unique_entries if existing_hashes is not None else unique_hashes
 
 def write_ndjson(data, file_path):
-    with open(file_path, 'w') as file:
-        for entry in data:
-            file.write(json.dumps(entry) + '\n')
+    write_packages(data, file_path)
+
+
+def hash_record(entry):
+    return repo_key(entry), hash_entry(entry)
+
+
+def hash_file(file_path, pool, jobs=None):
+    """
+    Computes the content hash of every entry, keyed by canonical repo URL, across the worker pool.
+    Workers parse and hash their own chunk of the file, only the (key, hash) pairs come back.
+    """
+
+    return dict(read_ndjson_parallel(file_path, transform=hash_record, jobs=jobs, pool=pool))
+
+
+# Keys read_entries looks for. Set once per worker by the pool initializer instead of being sent
+# with every chunk task, and in this process for the files read without a pool.
+wanted_keys = set()
+
+def set_wanted_keys(keys):
+    global wanted_keys
+    wanted_keys = keys
+
+
+def wanted_entry(entry):
+    key = repo_key(entry)
+    return (key, entry) if key in wanted_keys else None
+
+
+def read_entries(file_paths, keys, jobs=None):
+    """
+    Returns, for each file, the entries whose canonical repo URL is in keys, keyed by it. Workers
+    get keys once, when the pool starts, parse their chunk of a file and only send back the matching
+    entries.
+    """
+
+    set_wanted_keys(keys)
+    try:
+        with Pool(processes=jobs, initializer=set_wanted_keys, initargs=(keys,)) as pool:
+            return [dict(read_ndjson_parallel(file_path, transform=wanted_entry, jobs=jobs, pool=pool)) for file_path in file_paths]
+    finally:
+        set_wanted_keys(set())
+
+
+def find_changed(file1_path, file2_path, output_file, jobs=None):
+    """
+    Writes the entries whose package_repo is in both files but whose content differs.
+
+    Entries are compared by content hash (hash_entry), computed in parallel. Both files are then
+    read a second time across a pool whose workers get the changed keys once and only send back
+    the entries of those keys. Each output line holds the repo, the names of the changed fields
+    and the old (file1) and new (file2) entry.
+
+    The changed entries of both files are held in memory until the output is written, so memory
+    grows with the number of changed entries, not with the size of the files.
+    """
+
+    start = time.perf_counter()
+
+    with Pool(processes=jobs) as pool:
+        hashes1 = hash_file(file1_path, pool, jobs)
+        hashes2 = hash_file(file2_path, pool, jobs)
+
+    changed_keys = {key for key, entry_hash in hashes1.items() if key in hashes2 and hashes2[key] != entry_hash}
+    count = len(hashes1) + len(hashes2)
+    del hashes1, hashes2
+
+    old_entries, new_entries = read_entries([file1_path, file2_path], changed_keys, jobs)
+
+    with open(output_file, 'w') as file:
+        for key in sorted(changed_keys):
+            old, new = old_entries[key], new_entries[key]
+            changed_fields = [field for field in {**old, **new} if old.get(field) != new.get(field)]
+            file.write(codec.dumps({"package_repo": key, "changed_fields": changed_fields, "old": old, "new": new}) + '\n')
+
+    elapsed = time.perf_counter() - start
+    print(f"Hashed {count} records in {elapsed:.1f}s ({count / elapsed:.0f} records/s)")
+    print(f"{len(changed_keys)} changed entries written to {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the entries whose package_repo appears in only one of two package files.")
+    parser.add_argument("file1_path", help="First packages file, e.g. extracted/npm_packages_100_brokey.ndjson")
+    parser.add_argument("file2_path", help="Second packages file, e.g. extracted/npm_packages_100.ndjson")
+    parser.add_argument("--streaming", action="store_true", help="Diff through hash partitions on disk, for files bigger than memory.")
+    parser.add_argument("--partitions", type=int, default=64, help="Number of partitions for --streaming.")
+    parser.add_argument("--temp-dir", default=None, help="Directory for the --streaming partitions.")
+    parser.add_argument("--changes", action="store_true", help="Also write changed_<file2>.ndjson with entries present in both files whose content differs.")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes parsing the files and hashing with --changes. Defaults to the number of cores.")
+    args = parser.parse_args()
+
+    # Output files
+    output_file1 = modify_file_path(args.file1_path, 'unique_to_')
+    output_file2 = modify_file_path(args.file2_path, 'unique_to_')
 
-# Replace these with the absolute paths to your files
-file1_path = sys.argv[1] # '/home/shantanu/duality/python-utils/PSQL_Extractor/extracted/npm_packages_100_brokey.ndjson'
-file2_path = sys.argv[2] # '/home/shantanu/duality/python-utils/PSQL_Extractor/extracted/npm_packages_100.ndjson'
+    # Run the comparison
+    if args.streaming:
+        compare_ndjson_streaming(args.file1_path, args.file2_path, output_file1, output_file2, args.partitions, args.temp_dir)
+    else:
+        compare_ndjson(args.file1_path, args.file2_path, output_file1, output_file2, args.jobs)
 
-# Output files
-output_file1 = modify_file_path(file1_path, 'unique_to_')
-output_file2 = modify_file_path(file2_path, 'unique_to_')
+    if args.changes:
+        directory, filename = os.path.split(args.file2_path)
+        changes_file = os.path.join(directory, f"changed_{filename.split('.')[0]}.ndjson")
+        find_changed(args.file1_path, args.file2_path, changes_file, args.jobs)
 
-# Run the comparison
-compare_ndjson(file1_path, file2_path, output_file1, output_file2)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import os, re, struct, threading
+from math import prod
+import ndjson_codec as codec
+
+# Column types understood by the decoders. Each query read through COPY needs a matching
+# tuple of these, one per selected column, so rows come out the same as from a psycopg2 cursor.
+INT, TEXT, BOOL, JSONB, TEXT_ARRAY = "int", "text", "bool", "jsonb", "text[]"
+
+BINARY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+copy_escape = re.compile(rb"\\(?:([0-7]{1,3})|x([0-9a-fA-F]{1,2})|(.))", re.DOTALL)
+copy_escape_chars = {b"b": b"\b", b"f": b"\f", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"v": b"\v"}
+
+
+def unescape_text(field : bytes) -> str:
+    """
+    Reverses the backslash escaping of COPY text format.
+    """
+
+    if b"\\" not in field:
+        return field.decode("utf-8")
+
+    def replace(match):
+        octal, hexa, char = match.groups()
+        if octal:
+            return bytes([int(octal, 8) & 0xFF])
+        if hexa:
+            return bytes([int(hexa, 16)])
+        return copy_escape_chars.get(char, char)
+
+    return copy_escape.sub(replace, field).decode("utf-8")
+
+
+def parse_text_array(value : str) -> list:
+    """
+    Parses a Postgres array literal such as {MIT,"Apache 2.0",NULL}. Multidimensional arrays,
+    e.g. {{a,b},{c,d}}, give nested lists.
+    """
+
+    items, _ = parse_array_at(value, 0)
+    return items
+
+
+def parse_array_at(value : str, i : int) -> tuple:
+    """
+    Parses the array literal starting with the `{` at position i.
+
+    Returns:
+    - (items, end) (tuple): The parsed list and the position right after its closing `}`.
+    """
+
+    items = []
+    i += 1
+
+    while value[i] != '}':
+        if value[i] == '{':
+            item, i = parse_array_at(value, i)
+            items.append(item)
+        elif value[i] == '"':
+            i += 1
+            chars = []
+            while value[i] != '"':
+                if value[i] == '\\':
+                    i += 1
+                chars.append(value[i])
+                i += 1
+            items.append("".join(chars))
+            i += 1
+        else:
+            j = i
+            while value[j] not in ',}':
+                j += 1
+            item = value[i:j]
+            items.append(None if item == "NULL" else item)
+            i = j
+
+        if value[i] == ',':
+            i += 1
+
+    return items, i + 1
+
+
+def decode_text_field(value : str, column_type : str):
+    if column_type == INT:
+        return int(value)
+    if column_type == BOOL:
+        return value == "t"
+    if column_type == JSONB:
+        return codec.loads(value)
+    if column_type == TEXT_ARRAY:
+        return parse_text_array(value)
+    return value
+
+
+def decode_binary_array(data : bytes) -> list:
+    """
+    Decodes a text[] value in COPY binary format. Multidimensional arrays give nested lists.
+    """
+
+    ndim, _, _ = struct.unpack_from(">iiI", data)
+    if ndim == 0:
+        return []
+
+    lengths = [struct.unpack_from(">i", data, 12 + 8 * dim)[0] for dim in range(ndim)]
+    offset = 12 + 8 * ndim
+    items = []
+
+    for _ in range(prod(lengths)):
+        size, = struct.unpack_from(">i", data, offset)
+        offset += 4
+        if size == -1:
+            items.append(None)
+        else:
+            items.append(data[offset:offset + size].decode("utf-8"))
+            offset += size
+
+    # Elements come in row-major order, group them from the innermost dimension out
+    for length in reversed(lengths[1:]):
+        items = [items[i:i + length] for i in range(0, len(items), length)]
+
+    return items
+
+
+def decode_binary_field(data : bytes, column_type : str):
+    if column_type == INT:
+        return int.from_bytes(data, "big", signed=True)
+    if column_type == BOOL:
+        return data != b"\x00"
+    if column_type == JSONB:
+        return codec.loads(data[1:]) # Leading byte is the jsonb format version
+    if column_type == TEXT_ARRAY:
+        return decode_binary_array(data)
+    return data.decode("utf-8")
+
+
+def read_text_rows(stream, column_types : tuple):
+    """
+    Parses COPY text format from a binary stream, yielding one tuple per row.
+    """
+
+    for line in stream:
+        fields = line.rstrip(b"\n").split(b"\t")
+        yield tuple(
+            None if field == b"\\N" else decode_text_field(unescape_text(field), column_type)
+            for field, column_type in zip(fields, column_types)
+        )
+
+
+def read_exactly(stream, size : int) -> bytes:
+    data = stream.read(size)
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError("COPY stream ended in the middle of a row")
+        data += chunk
+    return data
+
+
+def read_binary_rows(stream, column_types : tuple):
+    """
+    Parses COPY binary format from a binary stream, yielding one tuple per row.
+    """
+
+    if read_exactly(stream, len(BINARY_SIGNATURE)) != BINARY_SIGNATURE:
+        raise ValueError("Not a COPY binary stream")
+
+    _, extension_length = struct.unpack(">iI", read_exactly(stream, 8))
+    read_exactly(stream, extension_length)
+
+    while True:
+        field_count, = struct.unpack(">h", read_exactly(stream, 2))
+        if field_count == -1:
+            return
+
+        row = []
+        for column_type in column_types[:field_count]:
+            size, = struct.unpack(">i", read_exactly(stream, 4))
+            row.append(None if size == -1 else decode_binary_field(read_exactly(stream, size), column_type))
+        yield tuple(row)
+
+
+def copy_rows(conn, query : str, params : tuple, column_types : tuple, binary=False):
+    """
+    Streams the result of a query through `COPY (query) TO STDOUT` and yields decoded rows.
+
+    The COPY runs in a background thread writing into a pipe, so rows are parsed while the
+    server is still sending them.
+
+    Parameters:
+    - conn: psycopg2 connection.
+    - query (str): SELECT statement with %s placeholders. Must not end with a semicolon.
+    - params (tuple): Query parameters.
+    - column_types (tuple): One of INT, TEXT, BOOL, JSONB or TEXT_ARRAY per selected column.
+    - binary (bool, optional): Use COPY binary format instead of text.
+
+    Yields:
+    - tuple: One row, with the same Python values a psycopg2 cursor would return.
+    """
+
+    cursor = conn.cursor()
+    select = cursor.mogrify(query, params).decode("utf-8")
+    copy = f"COPY ({select}) TO STDOUT" + (" WITH (FORMAT binary)" if binary else "")
+
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, "wb") as writer:
+                cursor.copy_expert(copy, writer)
+        except Exception as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        with os.fdopen(read_fd, "rb") as reader:
+            try:
+                if binary:
+                    yield from read_binary_rows(reader, column_types)
+                else:
+                    yield from read_text_rows(reader, column_types)
+            except (EOFError, struct.error):
+                producer.join()
+                if not errors:
+                    raise
+            else:
+                # Drain whatever is left so the producer never blocks on a full pipe
+                while reader.read(65536):
+                    pass
+    finally:
+        # Also when the consumer stops early or raises: the read end is closed by now, so a producer
+        # still writing fails with a broken pipe and ends the COPY instead of blocking
+        producer.join()
+        cursor.close()
+
+    if errors:
+        raise errors[0]
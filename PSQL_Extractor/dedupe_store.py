@@ -0,0 +1,184 @@
+import sqlite3
+
+class MemoryDedupeStore:
+    """
+    Dedupe store backed by a Python set. Lives for one process only.
+    """
+
+    def __init__(self):
+        self.keys = set()
+
+    def __contains__(self, key : str) -> bool:
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def add(self, key : str):
+        self.keys.add(key)
+
+    def update(self, keys):
+        self.keys.update(keys)
+
+    def clear(self):
+        self.keys.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullDedupeStore:
+    """
+    Dedupe store that never reports a key as seen, for callers that deduplicate further down the line.
+    """
+
+    def __contains__(self, key : str) -> bool:
+        return False
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def add(self, key : str):
+        pass
+
+    def update(self, keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StagedDedupeStore:
+    """
+    Dedupe store that keeps new keys aside until commit(), then adds them to a backing store.
+    Lets the backing store only learn about keys once the output they belong to is durable.
+
+    Parameters:
+    - backing: Any dedupe store. Its keys count as seen.
+    """
+
+    def __init__(self, backing):
+        self.backing = backing
+        self.staged = set()
+
+    def __contains__(self, key : str) -> bool:
+        return key in self.staged or key in self.backing
+
+    def __len__(self):
+        return len(self.backing) + len(self.staged)
+
+    def __iter__(self):
+        yield from self.backing
+        yield from self.staged
+
+    def add(self, key : str):
+        self.staged.add(key)
+
+    def update(self, keys):
+        self.staged.update(keys)
+
+    def commit(self):
+        self.backing.update(self.staged)
+        self.backing.flush()
+        self.staged.clear()
+
+    def clear(self):
+        self.staged.clear()
+        self.backing.clear()
+
+    def flush(self):
+        self.backing.flush()
+
+    def close(self):
+        self.backing.close()
+
+
+class SqliteDedupeStore:
+    """
+    Dedupe store backed by an on-disk SQLite table, so seen keys survive between runs.
+
+    Parameters:
+    - path (str): SQLite database file. Created if missing.
+    - commit_every (int, optional): Number of adds between commits.
+    """
+
+    def __init__(self, path : str, commit_every=10000):
+        self.path = path
+        self.commit_every = commit_every
+        self.pending = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.conn.commit()
+
+    def __contains__(self, key : str) -> bool:
+        return self.conn.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute("SELECT key FROM seen"))
+
+    def add(self, key : str):
+        self.conn.execute("INSERT OR IGNORE INTO seen (key) VALUES (?)", (key,))
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.flush()
+
+    def update(self, keys):
+        self.conn.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", ((key,) for key in keys))
+        self.flush()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM seen")
+        self.flush()
+
+    def flush(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def open_dedupe_store(kind="memory", path=None):
+    """
+    Creates a dedupe store.
+
+    Parameters:
+    - kind (str, optional): "memory" or "sqlite".
+    - path (str, optional): SQLite file for the on-disk store.
+
+    Returns:
+    - A store supporting `in`, `add`, `update`, `clear`, `flush` and `close`.
+    """
+
+    if kind == "memory":
+        return MemoryDedupeStore()
+
+    if path is None:
+        raise ValueError(f"A path is required for the {kind} dedupe store")
+
+    if kind == "sqlite":
+        return SqliteDedupeStore(path)
+
+    raise ValueError(f"Unknown dedupe store: {kind}")
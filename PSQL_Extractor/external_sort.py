@@ -0,0 +1,122 @@
+import os, heapq, tempfile
+import ndjson_codec as codec
+from package_io import write_lines
+
+class ExternalSortWriter:
+    """
+    Streams package dicts to disk and writes them out sorted by downloads (descending).
+
+    Records are buffered until the buffer reaches `max_buffer_bytes`, then the buffer is sorted
+    and spilled to a temporary run file. `finish` merges all runs into the output file, first
+    merging consecutive runs `max_fan_in` at a time when there are more, so only that many files
+    are open at once. The sort is stable, so the output is byte-identical to sorting the full list
+    in memory.
+
+    Parameters:
+    - output_file (str): Path of the sorted output file. Its extension selects the format, see package_io.
+    - max_buffer_bytes (int): Approximate cap on serialized records held in memory.
+    - temp_dir (str, optional): Directory for run files. Defaults to the output file's directory.
+    """
+
+    max_fan_in = 64
+
+    def __init__(self, output_file : str, max_buffer_bytes : int, temp_dir=None):
+        self.output_file = output_file
+        self.max_buffer_bytes = max_buffer_bytes
+        self.temp_dir = temp_dir or os.path.dirname(os.path.abspath(output_file))
+
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.run_files = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, package : dict):
+        line = codec.dumps(package)
+        self.buffer.append((package["downloads"], line))
+        self.buffer_bytes += len(line)
+        self.count += 1
+
+        if self.buffer_bytes >= self.max_buffer_bytes:
+            self.spill()
+
+    def sorted_buffer(self) -> list:
+        return sorted(self.buffer, key=lambda item: item[0], reverse=True)
+
+    def spill(self):
+        """
+        Sorts the in-memory buffer and writes it to a new run file.
+        """
+
+        if not self.buffer:
+            return
+
+        self.run_files.append(self.write_run(self.sorted_buffer()))
+        self.buffer = []
+        self.buffer_bytes = 0
+
+    def write_run(self, items) -> str:
+        fd, run_file = tempfile.mkstemp(prefix="run_", suffix=".tmp", dir=self.temp_dir)
+        with os.fdopen(fd, "w") as f:
+            for downloads, line in items:
+                f.write(f"{downloads}\t{line}\n")
+        return run_file
+
+    @staticmethod
+    def merge_runs(run_files : list):
+        runs = [ExternalSortWriter.read_run(run_file) for run_file in run_files]
+        return heapq.merge(*runs, key=lambda item: item[0], reverse=True)
+
+    def reduce_runs(self):
+        """
+        Merges consecutive run files, max_fan_in at a time, until at most max_fan_in are left.
+        Keeping the runs in order keeps the merge stable.
+        """
+
+        while len(self.run_files) > self.max_fan_in:
+            run_files, self.run_files = self.run_files, []
+            for i in range(0, len(run_files), self.max_fan_in):
+                group = run_files[i:i + self.max_fan_in]
+                self.run_files.append(self.write_run(self.merge_runs(group)))
+                for run_file in group:
+                    os.remove(run_file)
+
+    @staticmethod
+    def read_run(run_file : str):
+        with open(run_file) as f:
+            for row in f:
+                downloads, line = row.rstrip('\n').split('\t', 1)
+                yield int(downloads), line
+
+    def finish(self, exclude=None) -> int:
+        """
+        Merges all runs (and whatever is still buffered) into the output file.
+
+        Parameters:
+        - exclude (set, optional): package_repo values to leave out of the output.
+
+        Returns:
+        - count (int): Number of records written.
+        """
+
+        if self.run_files:
+            self.spill()
+            self.reduce_runs()
+            merged = self.merge_runs(self.run_files)
+        else:
+            merged = self.sorted_buffer()
+
+        lines = (line for downloads, line in merged)
+        if exclude:
+            # Records are only parsed again when there is something to leave out
+            lines = (line for line in lines if codec.loads(line)["package_repo"] not in exclude)
+        count = write_lines(lines, self.output_file)
+
+        for run_file in self.run_files:
+            os.remove(run_file)
+
+        self.buffer = []
+        self.run_files = []
+        return count
@@ -0,0 +1,101 @@
+import sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+def estimate_size(value) -> int:
+    """
+    Approximate memory held by a row value in bytes, nested containers included.
+    """
+
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class AdaptiveBatchSize:
+    """
+    Picks fetch sizes so a batch of rows stays within a memory budget.
+
+    After every batch, the average row size is estimated from an evenly spread sample of its rows
+    and folded into a moving average. The next size is the budget divided by that average, within
+    [minimum, maximum]. Rows with big repo_metadata blobs shrink the batches, small rows grow them.
+
+    Parameters:
+    - budget_bytes (int): Memory one batch of rows may take.
+    - initial (int, optional): Size of the first fetch, before any row was seen.
+    - minimum, maximum (int, optional): Bounds of the fetch size.
+    - sample (int, optional): Rows measured per batch.
+    - smoothing (float, optional): Weight of the newest batch in the moving average.
+    """
+
+    def __init__(self, budget_bytes : int, initial=1000, minimum=50, maximum=20000, sample=32, smoothing=0.3):
+        self.budget_bytes = budget_bytes
+        self.minimum = minimum
+        self.maximum = maximum
+        self.sample = sample
+        self.smoothing = smoothing
+
+        self.size = max(minimum, min(initial, maximum))
+        self.row_bytes = None
+
+    def observe(self, records : list) -> int:
+        """
+        Updates the row size estimate with a fetched batch.
+
+        Returns:
+        - size (int): The next fetch size.
+        """
+
+        if not records:
+            return self.size
+
+        step = max(1, len(records) // self.sample)
+        sampled = records[::step][:self.sample]
+        row_bytes = sum(map(estimate_size, sampled)) / len(sampled)
+
+        if self.row_bytes is None:
+            self.row_bytes = row_bytes
+        else:
+            self.row_bytes += self.smoothing * (row_bytes - self.row_bytes)
+
+        self.size = int(max(self.minimum, min(self.budget_bytes / self.row_bytes, self.maximum)))
+        return self.size
+
+
+def timed(fetch, size : int) -> tuple:
+    started = time.perf_counter()
+    records = fetch(size)
+    return records, time.perf_counter() - started
+
+
+def prefetch_batches(fetch, batch_size : AdaptiveBatchSize, on_fetch=None):
+    """
+    Yields batches of rows while the next batch is already being fetched in a background thread.
+
+    psycopg2 releases the GIL while it waits on the server, so the next fetch overlaps with the
+    processing of the current batch. At most two batches are held at once, the one being processed
+    and the one in flight.
+
+    Parameters:
+    - fetch (callable): fetch(size) -> list of at most `size` rows, empty when exhausted. Only
+      ever called from the background thread, one call at a time.
+    - batch_size (AdaptiveBatchSize): Decides the size of every fetch.
+    - on_fetch (callable, optional): on_fetch(rows, seconds), called for every fetch, e.g. metrics.record_fetch.
+
+    Yields:
+    - list: One non-empty batch of rows.
+    """
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(timed, fetch, batch_size.size)
+
+        while True:
+            records, seconds = pending.result()
+            if on_fetch is not None:
+                on_fetch(len(records), seconds)
+            if not records:
+                return
+
+            pending = executor.submit(timed, fetch, batch_size.observe(records))
+            yield records
@@ -0,0 +1,107 @@
+import time, json, logging, resource
+from collections import Counter
+
+class ExtractionMetrics:
+    """
+    Throughput, latency and reject-reason counters for one extraction.
+
+    Progress is logged through the "logger" logger set up by logger.init_logger, at most once
+    every `interval` seconds. Nothing is logged if init_logger was never called.
+
+    Parameters:
+    - name (str): Label used in log lines and the summary, e.g. the ecosystem.
+    - interval (float, optional): Seconds between progress reports. None disables them.
+    """
+
+    def __init__(self, name : str, interval=30.0):
+        self.name = name
+        self.interval = interval
+        self.log = logging.getLogger("logger")
+
+        self.rows_fetched = 0
+        self.batches = 0
+        self.fetch_seconds = 0.0
+        self.max_fetch_seconds = 0.0
+        self.process_seconds = 0.0
+        self.sink_seconds = 0.0
+        self.emitted = 0
+        self.drop_reasons = Counter()
+
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def record_fetch(self, rows : int, seconds : float):
+        self.rows_fetched += rows
+        self.batches += 1
+        self.fetch_seconds += seconds
+        self.max_fetch_seconds = max(self.max_fetch_seconds, seconds)
+
+    def record_process(self, seconds : float, emitted : int):
+        self.process_seconds += seconds
+        self.emitted += emitted
+
+    def record_sink(self, seconds : float):
+        # Time spent handing packages to the sink, e.g. ExternalSortWriter buffering and spilling
+        self.sink_seconds += seconds
+
+    def drop(self, reason : str, count=1):
+        self.drop_reasons[reason] += count
+
+    @staticmethod
+    def peak_memory_mb() -> float:
+        # ru_maxrss is in KB on Linux. Children covers --workers processes that have exited.
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return max(own, children) / 1024
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "name": self.name,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_fetched": self.rows_fetched,
+            "rows_per_second": round(self.rows_fetched / elapsed, 1) if elapsed else 0.0,
+            "batches": self.batches,
+            "fetch_seconds": round(self.fetch_seconds, 3),
+            "mean_fetch_latency_ms": round(self.fetch_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+            "max_fetch_latency_ms": round(self.max_fetch_seconds * 1000, 3),
+            "process_record_seconds": round(self.process_seconds, 3),
+            "sink_seconds": round(self.sink_seconds, 3),
+            "emitted": self.emitted,
+            "dropped": dict(self.drop_reasons),
+            "peak_memory_mb": round(self.peak_memory_mb(), 1),
+        }
+
+    def merge(self, snapshot : dict):
+        """
+        Adds the counters of a snapshot taken in another process (e.g. a --workers worker).
+
+        `emitted` is left out: a worker's packages still go through the caller's dedupe, which
+        records what it emits with record_process.
+        """
+
+        self.rows_fetched += snapshot["rows_fetched"]
+        self.batches += snapshot["batches"]
+        self.fetch_seconds += snapshot["fetch_seconds"]
+        self.max_fetch_seconds = max(self.max_fetch_seconds, snapshot["max_fetch_latency_ms"] / 1000)
+        self.process_seconds += snapshot["process_record_seconds"]
+        self.sink_seconds += snapshot["sink_seconds"]
+        self.drop_reasons.update(snapshot["dropped"])
+
+    def report(self):
+        s = self.snapshot()
+        self.log.info(
+            f"[{self.name}] {s['rows_fetched']} rows ({s['rows_per_second']} rows/s), "
+            f"fetch latency mean {s['mean_fetch_latency_ms']} ms / max {s['max_fetch_latency_ms']} ms, "
+            f"process_record {s['process_record_seconds']} s, sink {s['sink_seconds']} s, emitted {s['emitted']}, "
+            f"dropped {s['dropped']}, peak memory {s['peak_memory_mb']} MB"
+        )
+        self.last_report = time.perf_counter()
+
+    def maybe_report(self):
+        if self.interval is not None and time.perf_counter() - self.last_report >= self.interval:
+            self.report()
+
+    def write_summary(self, file_path : str):
+        with open(file_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=4)
@@ -0,0 +1,73 @@
+import os, json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Raised by loads on malformed input, whatever the backend. orjson's error subclasses json's.
+DecodeError = (json.JSONDecodeError,) + ((msgspec.DecodeError,) if msgspec else ())
+
+# Fastest first. Override with the NDJSON_CODEC environment variable, e.g. NDJSON_CODEC=json.
+preferred_backends = ["orjson", "msgspec", "json"]
+
+
+def available_backends() -> list:
+    return [name for name, module in (("orjson", orjson), ("msgspec", msgspec)) if module is not None] + ["json"]
+
+
+def json_dumps(obj, sort_keys=False) -> str:
+    return json.dumps(obj, sort_keys=sort_keys)
+
+
+def make_codec(name : str) -> tuple:
+    """
+    Returns:
+    - (loads, dumps) (tuple): loads(str or bytes) -> object, dumps(object, sort_keys=False) -> str.
+      dumps output is a single line.
+
+    Only loads uses the selected backend. dumps is always the json module's, since orjson and msgspec
+    write compact, unescaped UTF-8: output files and the hashes compare.py takes of entries must be
+    the same bytes whichever backend is installed.
+    """
+
+    if name == "orjson":
+        return orjson.loads, json_dumps
+
+    if name == "msgspec":
+        return msgspec.json.Decoder().decode, json_dumps
+
+    if name == "json":
+        return json.loads, json_dumps
+
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+
+def use_backend(name=None) -> str:
+    """
+    Selects the backend used by loads. Defaults to NDJSON_CODEC or the fastest one installed.
+
+    Returns:
+    - name (str): The selected backend.
+    """
+
+    global backend, loads, dumps
+
+    if name is None:
+        name = os.environ.get("NDJSON_CODEC") or next(b for b in preferred_backends if b in available_backends())
+    if name not in available_backends():
+        raise ImportError(f"JSON backend {name} is not installed")
+
+    loads, dumps = make_codec(name)
+    backend = name
+    return backend
+
+
+backend = None
+loads = dumps = None
+use_backend()
@@ -0,0 +1,208 @@
+import os, mmap, queue
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+import ndjson_codec as codec
+from package_io import detect_format, open_text, read_packages
+
+# Bytes of NDJSON per worker task. Big enough to amortize the pickling round trip, small enough
+# to keep every core busy near the end of the file.
+default_chunk_bytes = 8 << 20
+
+# Lines or records per task for inputs that can't be memory-mapped (gzip, zstd, Parquet)
+default_batch_size = 20000
+
+
+def chunk_bounds(file_path : str, chunk_bytes=default_chunk_bytes) -> list:
+    """
+    Splits an uncompressed NDJSON file into byte ranges that start and end on line boundaries.
+
+    Returns:
+    - bounds (list): (start, end) offsets, covering the whole file.
+    """
+
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+
+    bounds = []
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            newline = mm.find(b"\n", min(start + chunk_bytes, size) - 1)
+            end = size if newline == -1 else newline + 1
+            bounds.append((start, end))
+            start = end
+    return bounds
+
+
+def parse_lines(lines, transform=None) -> list:
+    """
+    Parses NDJSON lines, skipping blank ones. transform, if given, is applied to every record and
+    records it returns None for are dropped.
+    """
+
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        record = codec.loads(line)
+        if transform is not None:
+            record = transform(record)
+            if record is None:
+                continue
+        records.append(record)
+    return records
+
+
+def parse_chunk(file_path : str, start : int, end : int, transform=None) -> list:
+    # Each worker maps the file itself, only the offsets travel through the pool
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end]
+    return parse_lines(data.split(b"\n"), transform)
+
+
+def transform_records(records : list, transform=None) -> list:
+    if transform is None:
+        return records
+    return [record for record in map(transform, records) if record is not None]
+
+
+def batched(iterable, batch_size : int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def make_tasks(file_path : str, file_format : str, transform, chunk_bytes : int, batch_size : int):
+    """
+    Yields (function, args) tasks whose results, concatenated, are the file's records.
+    """
+
+    if file_format == "ndjson":
+        for start, end in chunk_bounds(file_path, chunk_bytes):
+            yield parse_chunk, (file_path, start, end, transform)
+
+    elif file_format == "parquet":
+        for records in batched(read_packages(file_path), batch_size):
+            yield transform_records, (records, transform)
+
+    else:
+        # Decompression stays in this process, parsing is spread over the pool
+        with open_text(file_path, file_format=file_format) as lines:
+            for batch in batched(lines, batch_size):
+                yield parse_lines, (batch, transform)
+
+
+def run_tasks(tasks, pool, ordered : bool, max_pending : int):
+    """
+    Submits the tasks to the pool with at most max_pending of them in flight, so results never
+    pile up faster than the caller consumes them. Yields each task's result.
+    """
+
+    if ordered:
+        pending = deque()
+        for function, args in tasks:
+            pending.append(pool.apply_async(function, args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        return
+
+    done = queue.Queue()
+    submitted = received = 0
+
+    def take():
+        result = done.get()
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    for function, args in tasks:
+        pool.apply_async(function, args, callback=done.put, error_callback=done.put)
+        submitted += 1
+        if submitted - received >= max_pending:
+            received += 1
+            yield take()
+    while received < submitted:
+        received += 1
+        yield take()
+
+
+def reduce_task(reduce, function, args):
+    return reduce(function(*args))
+
+
+def run_chunks(file_path : str, transform, reduce, jobs, ordered : bool, pool, chunk_bytes : int, batch_size : int):
+    """
+    Runs the file's tasks, in this process or over a pool, and yields each task's result: its list
+    of records, or reduce(records) when reduce is given.
+    """
+
+    file_format = detect_format(file_path)
+    tasks = make_tasks(file_path, file_format, transform, chunk_bytes, batch_size)
+    if reduce is not None:
+        tasks = ((reduce_task, (reduce, function, args)) for function, args in tasks)
+
+    # Not worth a pool: a single chunk, or Parquet records with nothing to do on them
+    small = file_format == "ndjson" and os.path.getsize(file_path) <= chunk_bytes
+    if jobs == 1 or small or (file_format == "parquet" and transform is None and reduce is None):
+        for function, args in tasks:
+            yield function(*args)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+
+    if pool is not None:
+        yield from run_tasks(tasks, pool, ordered, max_pending=2 * jobs)
+        return
+
+    with Pool(processes=jobs) as pool:
+        yield from run_tasks(tasks, pool, ordered, max_pending=2 * jobs)
+
+
+def read_ndjson_parallel(file_path : str, transform=None, jobs=None, ordered=True, pool=None,
+                         chunk_bytes=default_chunk_bytes, batch_size=default_batch_size):
+    """
+    Reads an NDJSON file with the parsing spread over a process pool.
+
+    Uncompressed files are memory-mapped and split into chunks at newline boundaries; each worker
+    maps the file and parses its own chunk. gzip/zstd files are decompressed here and parsed in
+    batches of lines. Parquet records only go through the pool when there is a transform.
+
+    Parameters:
+    - file_path (str): Plain, gzip/zstd compressed NDJSON or Parquet, detected from the content.
+    - transform (callable, optional): Applied to each record in the workers. Records it returns None
+      for are dropped. Must be picklable, i.e. a module-level function or a functools.partial of one.
+      Filtering or shrinking records here saves sending them back to this process.
+    - jobs (int, optional): Worker processes. Defaults to the number of cores. 1 reads in this process.
+    - ordered (bool, optional): Yield records in file order. False yields each chunk as soon as it is done.
+    - pool (multiprocessing.Pool, optional): Existing pool to use instead of starting one.
+    - chunk_bytes (int, optional): Size of the chunks of uncompressed files.
+    - batch_size (int, optional): Lines or records per task for the other formats.
+
+    Yields:
+    - One record (or transformed record) per line.
+    """
+
+    for records in run_chunks(file_path, transform, None, jobs, ordered, pool, chunk_bytes, batch_size):
+        yield from records
+
+
+def reduce_ndjson_parallel(file_path : str, reduce, transform=None, jobs=None, ordered=True, pool=None,
+                           chunk_bytes=default_chunk_bytes, batch_size=default_batch_size):
+    """
+    Like read_ndjson_parallel, but each worker also reduces the records of its chunk, e.g. to a
+    partial aggregate, and only that result comes back to this process.
+
+    Parameters:
+    - reduce (callable): reduce(records) -> result, applied in the worker to the list of (transformed)
+      records of one chunk. Must be picklable, like transform.
+    - The others as in read_ndjson_parallel.
+
+    Yields:
+    - One reduce result per chunk, in file order unless ordered is False.
+    """
+
+    yield from run_chunks(file_path, transform, reduce, jobs, ordered, pool, chunk_bytes, batch_size)
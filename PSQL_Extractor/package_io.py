@@ -0,0 +1,194 @@
+import io, gzip
+import ndjson_codec as codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Output format name -> file extension
+format_extensions = {
+    "ndjson": ".ndjson",
+    "gzip": ".ndjson.gz",
+    "zstd": ".ndjson.zst",
+    "parquet": ".parquet",
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+PARQUET_MAGIC = b"PAR1"
+
+parquet_batch_size = 50000
+
+
+def require(module, name : str):
+    if module is None:
+        raise ImportError(f"The {name} package is required for this format. Install it with `pip install {name}`.")
+
+
+def detect_format(file_path : str) -> str:
+    """
+    Detects the format of a packages file from its leading bytes.
+
+    Returns:
+    - One of the keys of format_extensions.
+    """
+
+    with open(file_path, "rb") as f:
+        magic = f.read(4)
+
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic == ZSTD_MAGIC:
+        return "zstd"
+    if magic == PARQUET_MAGIC:
+        return "parquet"
+    return "ndjson"
+
+
+def format_from_path(file_path : str) -> str:
+    for name, extension in sorted(format_extensions.items(), key=lambda item: -len(item[1])):
+        if file_path.endswith(extension):
+            return name
+    return "ndjson"
+
+
+def open_text(file_path : str, mode="r", file_format=None):
+    """
+    Opens an NDJSON file, compressed or not, as a text stream.
+
+    Parameters:
+    - file_path (str): Path of the file.
+    - mode (str, optional): "r" or "w".
+    - file_format (str, optional): "ndjson", "gzip" or "zstd". Detected from the content (reading)
+      or the extension (writing) when omitted.
+    """
+
+    if file_format is None:
+        file_format = detect_format(file_path) if mode == "r" else format_from_path(file_path)
+
+    if file_format == "gzip":
+        return gzip.open(file_path, mode + "t", compresslevel=6, encoding="utf-8")
+
+    if file_format == "zstd":
+        require(zstandard, "zstandard")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(file_path, "wb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    return open(file_path, mode)
+
+
+def package_schema():
+    require(pa, "pyarrow")
+    return pa.schema([
+        ("package_repo", pa.string()),
+        ("package_name", pa.string()),
+        ("repo_owner", pa.string()),
+        ("package_ecosystem", pa.string()),
+        ("package_licenses", pa.string()), # JSON-encoded, the nested licenses aren't uniformly typed
+        ("package_language", pa.string()),
+        ("package_starcount", pa.int64()),
+        ("downloads", pa.int64()),
+    ])
+
+
+def write_parquet(packages, file_path : str) -> int:
+    """
+    Writes package dicts to a Parquet file in row groups of parquet_batch_size.
+
+    Returns:
+    - count (int): Number of packages written.
+    """
+
+    require(pq, "pyarrow")
+    schema = package_schema()
+    count = 0
+
+    def flush(batch):
+        columns = {name: [package.get(name) for package in batch] for name in schema.names}
+        columns["package_licenses"] = [None if licenses is None else codec.dumps(licenses) for licenses in columns["package_licenses"]]
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    with pq.ParquetWriter(file_path, schema) as writer:
+        batch = []
+        for package in packages:
+            batch.append(package)
+            if len(batch) >= parquet_batch_size:
+                flush(batch)
+                count += len(batch)
+                batch = []
+        if batch or count == 0:
+            flush(batch)
+            count += len(batch)
+
+    return count
+
+
+def read_parquet(file_path : str):
+    require(pq, "pyarrow")
+    parquet_file = pq.ParquetFile(file_path)
+
+    for batch in parquet_file.iter_batches(batch_size=parquet_batch_size):
+        for package in batch.to_pylist():
+            if package["package_licenses"] is not None:
+                package["package_licenses"] = codec.loads(package["package_licenses"])
+            yield package
+
+
+def write_lines(lines, file_path : str) -> int:
+    """
+    Writes already serialized JSON lines in the format given by the file extension.
+
+    Returns:
+    - count (int): Number of lines written.
+    """
+
+    if format_from_path(file_path) == "parquet":
+        return write_parquet((codec.loads(line) for line in lines), file_path)
+
+    count = 0
+    with open_text(file_path, "w") as f:
+        for line in lines:
+            f.write(line)
+            f.write('\n')
+            count += 1
+    return count
+
+
+def write_packages(packages, file_path : str) -> int:
+    """
+    Writes package dicts in the format given by the file extension (.ndjson, .ndjson.gz, .ndjson.zst or .parquet).
+
+    Returns:
+    - count (int): Number of packages written.
+    """
+
+    if format_from_path(file_path) == "parquet":
+        return write_parquet(packages, file_path)
+    return write_lines((codec.dumps(package) for package in packages), file_path)
+
+
+def read_packages(file_path : str):
+    """
+    Reads package dicts from any supported format. The format is detected from the file content.
+
+    Yields:
+    - dict: One package per record.
+    """
+
+    if detect_format(file_path) == "parquet":
+        yield from read_parquet(file_path)
+        return
+
+    with open_text(file_path) as f:
+        for line in f:
+            yield codec.loads(line)
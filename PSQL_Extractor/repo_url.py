@@ -0,0 +1,50 @@
+import re
+from functools import lru_cache
+
+# Accepts the forms registries actually store: plain http(s), git+https, git://, ssh://git@ and
+# scp-like git@host:owner/name, with or without www., a .git suffix, trailing slashes or extra path.
+repo_url_pattern = re.compile(
+    r"^\s*(?:git\+)?(?:(?:https?|git|ssh)://)?(?:[^@/\s]+@)?(?:www\.)?(github|gitlab)\.com[:/]+"
+    r"([^/\s#?]+)/([^/\s#?]+?)(?:\.git)?(?:[/#?].*)?\s*$",
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_repo_url(url : str):
+    """
+    Splits a repository URL into its parts.
+
+    Parameters:
+    - url (str): Repository URL in any of the supported forms.
+
+    Returns:
+    - (host, owner, name) (tuple): host is "github" or "gitlab". None if the URL is not a GitHub/GitLab repository.
+    """
+
+    match = repo_url_pattern.match(url)
+    if not match:
+        return None
+
+    host, owner, name = match.groups()
+    return host.lower(), owner, name
+
+
+def canonical_repo_url(host : str, owner : str, name : str) -> str:
+    """
+    Builds the canonical form used as dedupe key: https://<host>.com/<owner>/<name>, lowercased.
+    GitHub and GitLab paths are case-insensitive, so casing differences map to the same key.
+    """
+
+    return f"https://{host}.com/{owner}/{name}".lower()
+
+
+@lru_cache(maxsize=1 << 16)
+def canonicalize_repo_url(url : str):
+    """
+    Returns:
+    - The canonical repository URL, or None if the URL is not a GitHub/GitLab repository.
+    """
+
+    parts = parse_repo_url(url)
+    return canonical_repo_url(*parts) if parts else None
@@ -0,0 +1,114 @@
+import os, json, shutil
+import ndjson_codec as codec
+from dedupe_store import StagedDedupeStore
+from package_io import read_packages
+
+class ResumableExtraction:
+    """
+    Write-ahead state of one extraction, so a crashed run can continue where it stopped.
+
+    Processed packages are appended to NDJSON segments in state_dir. Every segment_rows rows, the
+    segment is written and fsynced, then state.json records it along with the id of the last row
+    processed. Only after that do the segment's repos reach the dedupe store. A restart queries
+    past that id and drops any segment state.json doesn't list, so no row is fetched twice and
+    none is lost.
+
+    The dedupe state is the repos of the recorded segments. They are added to the store again on
+    restart, which rebuilds an in-memory store and is a no-op for an on-disk one that already has them.
+
+    Parameters:
+    - state_dir (str): Directory holding state.json and the segments. Created if missing.
+    - seen: Dedupe store of the run, e.g. `unique_urls`.
+    - segment_rows (int, optional): Rows processed per segment.
+
+    Usage:
+    - Use `append` as the packages sink and `tracking(processor)` as the row processor. Rows must
+      arrive in ascending id order, with the id as their first column.
+    """
+
+    def __init__(self, state_dir : str, seen, segment_rows=50000):
+        self.state_dir = state_dir
+        self.state_file = os.path.join(state_dir, "state.json")
+        self.segment_rows = segment_rows
+
+        os.makedirs(state_dir, exist_ok=True)
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+        else:
+            self.state = {"last_id": None, "rows": 0, "segments": []}
+
+        # Leftovers of a segment that was being written when the run died
+        for name in os.listdir(state_dir):
+            if name != "state.json" and name not in self.state["segments"]:
+                os.remove(os.path.join(state_dir, name))
+
+        seen.update(package["package_repo"] for package in self.packages())
+        seen.flush()
+        self.seen = StagedDedupeStore(seen)
+
+        self.buffer = []
+        self.rows = 0
+        self.last_id = self.state["last_id"]
+
+    @property
+    def resumed(self) -> bool:
+        return self.state["last_id"] is not None
+
+    def append(self, package : dict):
+        self.buffer.append(package)
+
+    def tracking(self, processor):
+        """
+        Wraps a row processor so every row is counted towards the current segment. A full segment
+        is committed before the next row is processed, when all earlier rows are in the buffer.
+        """
+
+        def track(record):
+            if self.rows >= self.segment_rows:
+                self.commit()
+            self.rows += 1
+            self.last_id = record[0]
+            return processor(record)
+        return track
+
+    @staticmethod
+    def write_durably(path : str, data : str):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def commit(self):
+        """
+        Writes the buffered packages as a new segment and records it with the last processed id.
+        """
+
+        if self.rows == 0:
+            return
+
+        name = f"segment_{len(self.state['segments']) + 1:05d}.ndjson"
+        self.write_durably(os.path.join(self.state_dir, name), "".join(codec.dumps(package) + "\n" for package in self.buffer))
+
+        self.state["segments"].append(name)
+        self.state["last_id"] = self.last_id
+        self.state["rows"] += self.rows
+        self.write_durably(self.state_file, json.dumps(self.state, indent=4))
+
+        self.seen.commit()
+        self.buffer = []
+        self.rows = 0
+
+    def packages(self):
+        """
+        Yields:
+        - The packages of all recorded segments, in the order they were processed.
+        """
+
+        for name in self.state["segments"]:
+            yield from read_packages(os.path.join(self.state_dir, name))
+
+    def discard(self):
+        shutil.rmtree(self.state_dir)
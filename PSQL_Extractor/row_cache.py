@@ -0,0 +1,110 @@
+import os, struct, pickle
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# File layout: MAGIC, one serializer byte, then chunks of rows, each a 4-byte big-endian length
+# followed by the serialized list of rows.
+MAGIC = b"PKGROWS1"
+LENGTH = struct.Struct(">I")
+
+# Rows per chunk, same as the fetch batches
+chunk_rows = 1000
+
+# Serializer byte -> (dumps, loads). msgpack is more compact and faster, pickle is the fallback.
+serializers = {
+    b"p": (lambda rows: pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+}
+if msgpack is not None:
+    serializers[b"m"] = (msgpack.packb, msgpack.unpackb)
+
+
+def cache_path(cache_dir : str, ecosystem : str, filter_count : int, projected=False) -> str:
+    # Projected rows have another shape, so they get their own file
+    suffix = "_projected" if projected else ""
+    return os.path.join(cache_dir, f"{ecosystem}_{filter_count}{suffix}.rows")
+
+
+class RowCacheWriter:
+    """
+    Records raw query rows to a cache file, so they can be processed again without Postgres.
+
+    The file is written under a temporary name and only replaces the previous cache on close(),
+    so an interrupted recording never leaves a truncated cache behind.
+
+    Parameters:
+    - path (str): Cache file, see cache_path.
+    - serializer (bytes, optional): b"m" (msgpack) or b"p" (pickle). Defaults to msgpack when installed.
+    """
+
+    def __init__(self, path : str, serializer=None):
+        self.path = path
+        self.serializer = serializer or (b"m" if b"m" in serializers else b"p")
+        self.dumps = serializers[self.serializer][0]
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.temp_path = path + ".tmp"
+        self.file = open(self.temp_path, "wb")
+        self.file.write(MAGIC + self.serializer)
+
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        self.count += 1
+        if len(self.rows) >= chunk_rows:
+            self.write_chunk()
+
+    def write_chunk(self):
+        if not self.rows:
+            return
+        data = self.dumps(self.rows)
+        self.file.write(LENGTH.pack(len(data)))
+        self.file.write(data)
+        self.rows = []
+
+    def recording(self, processor):
+        """
+        Wraps a row processor so every row it sees is recorded first.
+        """
+
+        def record_and_process(record):
+            self.add(record)
+            return processor(record)
+        return record_and_process
+
+    def close(self) -> int:
+        """
+        Returns:
+        - count (int): Number of rows recorded.
+        """
+
+        self.write_chunk()
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+        return self.count
+
+
+def read_row_cache(path : str):
+    """
+    Reads a cache written by RowCacheWriter.
+
+    Yields:
+    - list: One chunk of rows. Rows are tuples (pickle) or lists (msgpack), the processors accept both.
+    """
+
+    with open(path, "rb") as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a row cache")
+
+        serializer = header[len(MAGIC):]
+        if serializer not in serializers:
+            raise ImportError(f"{path} was recorded with msgpack. Install it with `pip install msgpack`.")
+        loads = serializers[serializer][1]
+
+        while length := f.read(LENGTH.size):
+            yield loads(f.read(LENGTH.unpack(length)[0]))
@@ -0,0 +1,44 @@
+import os
+from dedupe_store import open_dedupe_store
+
+def threshold_store_path(path : str, threshold : int) -> str:
+    # extracted/seen_repos.sqlite -> extracted/seen_repos_1000.sqlite
+    root, extension = os.path.splitext(path)
+    return f"{root}_{threshold}{extension}"
+
+def open_threshold_stores(kind : str, path : str, thresholds) -> dict:
+    """
+    Opens one dedupe store per download threshold. On-disk stores get one file each, see threshold_store_path.
+
+    Returns:
+    - dict: threshold -> dedupe store.
+    """
+
+    return {threshold: open_dedupe_store(kind, threshold_store_path(path, threshold)) for threshold in thresholds}
+
+
+class ThresholdSplitter:
+    """
+    Packages sink that fans a single pass at the lowest download threshold out to one sink per threshold.
+
+    A package goes to the sink of every threshold its downloads meet, unless that threshold's dedupe
+    store has already seen its repo. Fed undeduplicated packages in query order, each sink receives
+    exactly what a separate extraction at its threshold would have produced.
+
+    Parameters:
+    - sinks (dict): threshold -> sink with an `append` method, e.g. a list or an ExternalSortWriter.
+    - stores (dict): threshold -> dedupe store, see dedupe_store.
+    """
+
+    def __init__(self, sinks : dict, stores : dict):
+        self.outputs = [(threshold, sinks[threshold], stores[threshold]) for threshold in sorted(sinks)]
+
+    def append(self, package : dict):
+        for threshold, sink, seen in self.outputs:
+            # Ascending thresholds, so no later one can match either
+            if package["downloads"] < threshold:
+                break
+
+            if package["package_repo"] not in seen:
+                seen.add(package["package_repo"])
+                sink.append(package)
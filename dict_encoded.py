@@ -0,0 +1,107 @@
+#! /usr/bin/python3
+
+## Dictionary-encoded NDJSON for ndjson_printer's aggregated records. Every distinct regex, file
+## path and input subject is written once and records refer to it by integer id.
+##
+## Layout, one JSON value per line:
+## - a header object, {"format": "dict_encoded", "version": 1}
+## - arrays of strings, appended to the string table in order, so the first string ever written has id 0
+## - records, objects whose string fields hold ids into the table. A record only uses strings from lines
+##   before it, so the file can be written and read in one pass.
+##
+## Example Usage ./dict_encoded.py aggregated.dict.ndjson > aggregated.ndjson
+
+import sys, json, argparse
+from stack_fingerprint import canonical
+
+header = {"format": "dict_encoded", "version": 1}
+
+# Record fields holding a string, and fields holding a list of strings
+string_fields = ("regex", "file_path")
+list_fields = ("inputs",)
+
+
+class DictEncodedWriter:
+    """
+    Writes records in the dictionary-encoded format to an open text file.
+
+    The string table stays in memory, it grows with the number of distinct strings, not with the
+    number of records.
+
+    Parameters:
+    - file: Text file opened for writing. The header is written right away.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.ids = {}
+        self.file.write(json.dumps(header) + "\n")
+
+    def string_id(self, value, new_strings : list) -> int:
+        # Subjects can be any JSON value. Other values than strings are keyed by their canonical
+        # encoding, which is hashable for lists and objects too and keeps true apart from 1.
+        key = value if type(value) is str else canonical(value)
+
+        string_id = self.ids.get(key)
+        if string_id is None:
+            string_id = self.ids[key] = len(self.ids)
+            new_strings.append(value)
+        return string_id
+
+    def write(self, record : dict):
+        new_strings = []
+        encoded = dict(record)
+
+        for field in string_fields:
+            if field in encoded:
+                encoded[field] = self.string_id(encoded[field], new_strings)
+        for field in list_fields:
+            if field in encoded:
+                encoded[field] = [self.string_id(value, new_strings) for value in encoded[field]]
+
+        if new_strings:
+            self.file.write(json.dumps(new_strings) + "\n")
+        self.file.write(json.dumps(encoded) + "\n")
+
+
+def read_dict_encoded(file_path : str):
+    """
+    Reads a file written by DictEncodedWriter.
+
+    Yields:
+    - dict: Each record with its strings restored, as it was written.
+    """
+
+    strings = []
+    with open(file_path) as lines:
+        if json.loads(next(lines, "null")) != header:
+            raise ValueError(f"{file_path} is not a dictionary-encoded file")
+
+        for line in lines:
+            if not line.strip():
+                continue
+
+            value = json.loads(line)
+            if isinstance(value, list):
+                strings.extend(value)
+                continue
+
+            for field in string_fields:
+                if field in value:
+                    value[field] = strings[value[field]]
+            for field in list_fields:
+                if field in value:
+                    value[field] = [strings[string_id] for string_id in value[field]]
+            yield value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a dictionary-encoded file back to one NDJSON record per line.")
+    parser.add_argument("file_path", help="Dictionary-encoded file, e.g. written by ndjson_printer --output-format dict")
+    args = parser.parse_args()
+
+    for record in read_dict_encoded(args.file_path):
+        sys.stdout.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+## Stable 64-bit fingerprints of JSON values, e.g. the usage stacks ndjson_printer de-duplicates.
+## Unlike hash(), which is salted per process, they are the same in every worker and every run,
+## so dedupe keys can be sent between processes or stored.
+
+import json, hashlib
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Canonical form: compact JSON with sorted keys, UTF-8 encoded. Always the json module's, even when
+# orjson is installed: orjson writes some floats differently (1e16 against 1e+16) and would change
+# the fingerprints depending on the machine.
+canonical_encoder = json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def canonical(value) -> bytes:
+    return canonical_encoder.encode(value).encode("utf-8")
+
+# xxh3 when installed, blake2b otherwise. Fingerprints only compare between runs with the same hash_backend.
+if xxhash is not None:
+    hash_backend = "xxh3_64"
+
+    def digest64(data : bytes) -> int:
+        return xxhash.xxh3_64_intdigest(data)
+else:
+    hash_backend = "blake2b_64"
+
+    def digest64(data : bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def fingerprint(value) -> int:
+    """
+    Returns:
+    - A 64-bit fingerprint of a JSON value. Equal values, whatever their key order, get equal fingerprints.
+    """
+
+    return digest64(canonical(value))
@@ -0,0 +1,6 @@
+import os, sys
+
+# The modules are scripts run from their own directories, make them importable the same way
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "PSQL_Extractor"))
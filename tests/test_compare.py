@@ -0,0 +1,64 @@
+import json, os
+import pytest
+import compare
+import ndjson_codec as codec
+from package_io import write_packages
+
+
+def package(i, **fields):
+    return {"package_repo": f"https://github.com/owner/pkg{i}", "package_name": f"pkg{i}", "downloads": i, **fields}
+
+
+# gzip files are always parsed in the worker pool, plain files this small in this process
+@pytest.mark.parametrize("new_file", ["new.ndjson", "new.ndjson.gz"])
+def test_find_changed(tmp_path, new_file):
+    old = [package(i) for i in range(200)]
+    new = [package(i) for i in range(50, 250)]
+    new[10]["downloads"] = -1                                      # pkg60
+    new[20] = {**new[20], "package_repo": "https://github.com/Owner/pkg70.git", "package_language": "Python"}
+    new[30]["package_name"] = "renamed"                             # pkg80
+
+    write_packages(old, str(tmp_path / "old.ndjson"))
+    write_packages(new, str(tmp_path / new_file))
+    compare.find_changed(str(tmp_path / "old.ndjson"), str(tmp_path / new_file), str(tmp_path / "changed.ndjson"), jobs=2)
+
+    changes = [json.loads(line) for line in (tmp_path / "changed.ndjson").read_text().splitlines()]
+    assert [change["package_repo"] for change in changes] == [
+        "https://github.com/owner/pkg60", "https://github.com/owner/pkg70", "https://github.com/owner/pkg80"]
+    assert changes[0]["changed_fields"] == ["downloads"]
+    assert changes[0]["old"] == old[60] and changes[0]["new"] == new[10]
+    assert changes[1]["changed_fields"] == ["package_repo", "package_language"]
+    assert changes[2]["changed_fields"] == ["package_name"]
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    old = [package(i) for i in range(300)]
+    new = [package(i) for i in range(100, 400)] + [package(5, package_repo="https://github.com/OWNER/pkg5/")]
+    write_packages(old, str(tmp_path / "old.ndjson"))
+    write_packages(new, str(tmp_path / "new.ndjson"))
+
+    outputs = {}
+    for name, run in [("memory", lambda out1, out2: compare.compare_ndjson(str(tmp_path / "old.ndjson"), str(tmp_path / "new.ndjson"), out1, out2, jobs=1)),
+                      ("streaming", lambda out1, out2: compare.compare_ndjson_streaming(str(tmp_path / "old.ndjson"), str(tmp_path / "new.ndjson"), out1, out2, partitions=7))]:
+        out1, out2 = str(tmp_path / f"{name}1.ndjson"), str(tmp_path / f"{name}2.ndjson")
+        run(out1, out2)
+        outputs[name] = [sorted(open(out).read().splitlines()) for out in (out1, out2)]
+
+    assert outputs["streaming"] == outputs["memory"]
+    assert len(outputs["memory"][0]) == 99 and len(outputs["memory"][1]) == 100
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to count open files")
+def test_partition_file_closes_partitions_on_errors(tmp_path):
+    (tmp_path / "broken.ndjson").write_text(json.dumps(package(1)) + "\n{not json\n")
+    (tmp_path / "parts").mkdir()
+
+    open_files = len(os.listdir("/proc/self/fd"))
+    error = None
+    try:
+        compare.partition_file(str(tmp_path / "broken.ndjson"), str(tmp_path / "parts"), 16)
+    except codec.DecodeError as e:
+        # Keeps the traceback, and with it the frame of partition_file, alive like a caller logging it would
+        error = e
+    assert error is not None
+    assert len(os.listdir("/proc/self/fd")) == open_files
@@ -0,0 +1,187 @@
+import io, os, struct, threading
+from contextlib import closing, nullcontext
+import pytest
+import copy_reader
+from copy_reader import INT, TEXT, BOOL, JSONB, TEXT_ARRAY, unescape_text, parse_text_array, decode_binary_array
+
+
+def binary_array(items, dims) -> bytes:
+    """
+    Encodes a text[] value the way COPY binary does. items is the flat list, dims the length of each dimension.
+    """
+
+    has_null = any(item is None for item in items)
+    data = struct.pack(">iiI", len(dims), int(has_null), 25) # 25 is the text oid
+    data += b"".join(struct.pack(">ii", length, 1) for length in dims)
+    for item in items:
+        if item is None:
+            data += struct.pack(">i", -1)
+        else:
+            encoded = item.encode("utf-8")
+            data += struct.pack(">i", len(encoded)) + encoded
+    return data
+
+
+def binary_stream(rows) -> io.BytesIO:
+    data = copy_reader.BINARY_SIGNATURE + struct.pack(">iI", 0, 0)
+    for row in rows:
+        data += struct.pack(">h", len(row))
+        for field in row:
+            data += struct.pack(">i", -1) if field is None else struct.pack(">i", len(field)) + field
+    return io.BytesIO(data + struct.pack(">h", -1))
+
+
+@pytest.mark.parametrize("field, expected", [
+    (b"plain", "plain"),
+    (b"tab\\there\\nnewline\\r", "tab\there\nnewline\r"),
+    (b"back\\\\slash", "back\\slash"),
+    (b"\\b\\f\\v", "\b\f\v"),
+    (b"octal \\101\\60", "octal A0"),
+    (b"hex \\x41\\x4a", "hex AJ"),
+    (b"utf-8 \\303\\251", "utf-8 é"),
+    ("raw é".encode("utf-8"), "raw é"),
+    (b"other \\. \\N", "other . N"),
+])
+def test_unescape_text(field, expected):
+    assert unescape_text(field) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("{}", []),
+    ("{MIT}", ["MIT"]),
+    ('{MIT,"Apache 2.0",NULL,"NULL"}', ["MIT", "Apache 2.0", None, "NULL"]),
+    ('{"a\\"b","c\\\\d","{x,y}",""}', ['a"b', "c\\d", "{x,y}", ""]),
+    ("{{a,b},{c,NULL}}", [["a", "b"], ["c", None]]),
+    ("{{{1,2}},{{3,4}}}", [[["1", "2"]], [["3", "4"]]]),
+])
+def test_parse_text_array(value, expected):
+    assert parse_text_array(value) == expected
+
+
+@pytest.mark.parametrize("items, dims, expected", [
+    ([], [], []),
+    (["MIT", None, "Apache 2.0"], [3], ["MIT", None, "Apache 2.0"]),
+    (["a", "b", "c", None], [2, 2], [["a", "b"], ["c", None]]),
+    (["1", "2", "3", "4", "5", "6"], [3, 1, 2], [[["1", "2"]], [["3", "4"]], [["5", "6"]]]),
+    (["é"], [1], ["é"]),
+])
+def test_decode_binary_array(items, dims, expected):
+    assert decode_binary_array(binary_array(items, dims)) == expected
+
+
+column_types = (INT, TEXT, BOOL, JSONB, TEXT_ARRAY)
+expected_rows = [
+    (1, "left-pad\tv2", True, {"full_name": "owner/left-pad", "license": None}, ["MIT", None]),
+    (-7, None, False, None, [["a", "b"], ["c", "d"]]),
+    (2**40, "é", None, [], []),
+]
+
+
+def test_read_text_rows():
+    stream = io.BytesIO(
+        b'1\tleft-pad\\tv2\tt\t{"full_name": "owner/left-pad", "license": null}\t{MIT,NULL}\n'
+        b"-7\t\\N\tf\t\\N\t{{a,b},{c,d}}\n"
+        + f"{2**40}\t\\303\\251\t\\N\t[]\t{{}}\n".encode("utf-8")
+    )
+    assert list(copy_reader.read_text_rows(stream, column_types)) == expected_rows
+
+
+def test_read_binary_rows():
+    stream = binary_stream([
+        (struct.pack(">i", 1), b"left-pad\tv2", b"\x01", b'\x01{"full_name": "owner/left-pad", "license": null}', binary_array(["MIT", None], [2])),
+        (struct.pack(">i", -7), None, b"\x00", None, binary_array(["a", "b", "c", "d"], [2, 2])),
+        (struct.pack(">q", 2**40), "é".encode("utf-8"), None, b"\x01[]", binary_array([], [])),
+    ])
+    assert list(copy_reader.read_binary_rows(stream, column_types)) == expected_rows
+
+
+def test_read_binary_rows_rejects_other_streams():
+    with pytest.raises(ValueError):
+        list(copy_reader.read_binary_rows(io.BytesIO(b"1\t2\n" * 4), column_types))
+
+
+def test_read_binary_rows_truncated():
+    data = binary_stream([(struct.pack(">i", 1), b"x", b"\x01", None, None)]).getvalue()
+    with pytest.raises(EOFError):
+        list(copy_reader.read_binary_rows(io.BytesIO(data[:-6]), column_types))
+
+
+class FakeCopyCursor:
+    # COPY of many more rows than the pipe holds, so the producer blocks once the consumer stops reading
+    def __init__(self):
+        self.closed = False
+
+    def mogrify(self, query, params):
+        return query.encode("utf-8")
+
+    def copy_expert(self, sql, file):
+        for i in range(200000):
+            file.write(f"{i}\tname {i}\n".encode("utf-8"))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCopyConnection:
+    def __init__(self):
+        self.cursors = []
+
+    def cursor(self):
+        self.cursors.append(FakeCopyCursor())
+        return self.cursors[-1]
+
+
+@pytest.mark.parametrize("consumer_error", [None, KeyError])
+def test_copy_rows_cleans_up_when_the_consumer_stops(consumer_error):
+    conn = FakeCopyConnection()
+    threads = threading.active_count()
+
+    with pytest.raises(consumer_error) if consumer_error else nullcontext():
+        with closing(copy_reader.copy_rows(conn, "SELECT id, name FROM packages", (), (INT, TEXT))) as rows:
+            assert next(rows) == (0, "name 0")
+            if consumer_error:
+                raise consumer_error()
+
+    assert conn.cursors[0].closed
+    assert threading.active_count() == threads
+
+
+def test_copy_rows_reads_everything():
+    rows = list(copy_reader.copy_rows(FakeCopyConnection(), "SELECT id, name FROM packages", (), (INT, TEXT)))
+    assert len(rows) == 200000 and rows[-1] == (199999, "name 199999")
+
+
+# Set PSQL_EXTRACTOR_TEST_DSN, e.g. "dbname=postgres user=postgres host=localhost", to run against a real server
+test_dsn = os.environ.get("PSQL_EXTRACTOR_TEST_DSN")
+
+sample_query = """
+        SELECT id, name, flag, metadata, licenses
+        FROM copy_reader_sample
+        WHERE id >= %s
+        ORDER BY id
+    """
+
+@pytest.mark.skipif(not test_dsn, reason="PSQL_EXTRACTOR_TEST_DSN is not set")
+def test_engines_return_identical_rows():
+    psycopg2 = pytest.importorskip("psycopg2")
+
+    conn = psycopg2.connect(test_dsn)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMPORARY TABLE copy_reader_sample (id bigint, name text, flag boolean, metadata jsonb, licenses text[]);
+            INSERT INTO copy_reader_sample VALUES
+                (1, E'tab\\there\\nnew line \\\\ back', true, '{"full_name": "o/r", "stargazers_count": 3, "license": null}', ARRAY['MIT', NULL, 'NULL', 'Apache 2.0', 'quote"d', 'comma,s', '{braces}']),
+                (2, NULL, false, NULL, NULL),
+                (3, 'é ü 中', NULL, '[1, "two", {"three": [3]}]', '{}'),
+                (4, '', true, '"string"', ARRAY[['a', 'b'], ['c', NULL]]),
+                (-5, E'\\\\N', false, '{}', ARRAY['']);
+        """)
+
+        cursor.execute(sample_query, (-10,))
+        expected = cursor.fetchall()
+
+        assert list(copy_reader.copy_rows(conn, sample_query, (-10,), column_types, binary=False)) == expected
+        assert list(copy_reader.copy_rows(conn, sample_query, (-10,), column_types, binary=True)) == expected
+    finally:
+        conn.close()
@@ -0,0 +1,60 @@
+import json, os, subprocess, sys
+import pytest
+from dict_encoded import DictEncodedWriter, read_dict_encoded, header
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+records = [
+    {"regex": "^a+$", "inputs": ["aaa", None, 1, True, 1.5, "1"], "file_path": "src/a.js"},
+    {"regex": "^a+$", "inputs": [["a", "list"], {"an": "object"}, {"an": ["other", "object"]}, "aaa"], "file_path": "src/b.js", "counts": [1, 2, 3, 4]},
+    {"regex": "\\d", "inputs": [], "file_path": "src/a.js"},
+    {"regex": "\\d", "inputs": [["a", "list"], {"an": "object"}, True, 1], "file_path": "src/b.js"},
+]
+
+
+def write(tmp_path, records):
+    file_path = str(tmp_path / "records.dict.ndjson")
+    with open(file_path, "w") as f:
+        writer = DictEncodedWriter(f)
+        for record in records:
+            writer.write(record)
+    return file_path
+
+
+def test_round_trip(tmp_path):
+    file_path = write(tmp_path, records)
+    assert list(read_dict_encoded(file_path)) == records
+
+
+def test_strings_are_written_once(tmp_path):
+    lines = [json.loads(line) for line in open(write(tmp_path, records))]
+    assert lines[0] == header
+
+    strings = [value for line in lines[1:] if isinstance(line, list) for value in line]
+    assert strings == ["^a+$", "src/a.js", "aaa", None, 1, True, 1.5, "1",
+                       "src/b.js", ["a", "list"], {"an": "object"}, {"an": ["other", "object"]}, "\\d"]
+    # Ids of the last record: true and 1 stay apart, lists and objects are found again
+    assert lines[-1]["inputs"] == [9, 10, 5, 4]
+
+
+def test_rejects_other_files(tmp_path):
+    (tmp_path / "plain.ndjson").write_text(json.dumps(records[0]) + "\n")
+    with pytest.raises(ValueError):
+        list(read_dict_encoded(str(tmp_path / "plain.ndjson")))
+
+
+def test_ndjson_printer_output_decodes_to_ndjson_output(tmp_path):
+    traces = [
+        {"pattern": "^x$", "usages": [{"subject": subject, "stack": {"entries": [
+            {"caller": {"object": "RegExp"}, "file_info": {"file_path": "src/x.js"}}]}}]}
+        for subject in ["x", ["x"], {"x": 1}, None, 1, True, "x"]
+    ]
+    (tmp_path / "traces.ndjson").write_text("".join(json.dumps(trace) + "\n" for trace in traces))
+
+    for output_format in ("ndjson", "dict"):
+        subprocess.run([sys.executable, os.path.join(root, "ndjson_printer"), "traces.ndjson", f"out.{output_format}",
+                        "--output-format", output_format, "--counts", "--jobs", "1"], cwd=tmp_path, check=True, capture_output=True)
+
+    expected = [json.loads(line) for line in (tmp_path / "out.ndjson").read_text().splitlines()]
+    assert list(read_dict_encoded(str(tmp_path / "out.dict"))) == expected
+    assert expected[0]["inputs"] == ["x", ["x"], {"x": 1}, None, 1, True]
@@ -0,0 +1,40 @@
+import os, random
+import pytest
+from external_sort import ExternalSortWriter
+from package_io import read_packages, write_packages
+
+
+def make_packages(count, seed=0):
+    rng = random.Random(seed)
+    # Few distinct download counts, so the stability of the merge matters
+    return [{"package_repo": f"https://github.com/owner/pkg{i}", "package_name": f"pkg{i}", "downloads": rng.randrange(20)}
+            for i in range(count)]
+
+
+@pytest.mark.parametrize("max_fan_in", [2, 3, 64])
+def test_matches_in_memory_sort(tmp_path, monkeypatch, max_fan_in):
+    monkeypatch.setattr(ExternalSortWriter, "max_fan_in", max_fan_in)
+    packages = make_packages(500)
+
+    write_packages(sorted(packages, key=lambda package: package["downloads"], reverse=True), str(tmp_path / "expected.ndjson"))
+    writer = ExternalSortWriter(str(tmp_path / "sorted.ndjson"), max_buffer_bytes=200)
+    for package in packages:
+        writer.append(package)
+    assert len(writer.run_files) > max_fan_in
+
+    assert writer.finish() == len(packages)
+    assert (tmp_path / "sorted.ndjson").read_bytes() == (tmp_path / "expected.ndjson").read_bytes()
+    assert sorted(os.listdir(tmp_path)) == ["expected.ndjson", "sorted.ndjson"]
+
+
+def test_exclude(tmp_path):
+    packages = make_packages(100)
+    excluded = {package["package_repo"] for package in packages[::3]}
+
+    writer = ExternalSortWriter(str(tmp_path / "sorted.ndjson"), max_buffer_bytes=500)
+    for package in packages:
+        writer.append(package)
+
+    assert writer.finish(exclude=excluded) == len(packages) - len(excluded)
+    assert {package["package_repo"] for package in read_packages(str(tmp_path / "sorted.ndjson"))} == \
+        {package["package_repo"] for package in packages} - excluded
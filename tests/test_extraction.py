@@ -0,0 +1,140 @@
+import json, os, sys
+import pytest
+
+PSQL_Extractor = pytest.importorskip("PSQL_Extractor")
+from dedupe_store import MemoryDedupeStore, SqliteDedupeStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(PSQL_Extractor.__file__), "benchmarks"))
+from synthetic import make_rows, fake_connect, FakeConnection, FakeCursor
+
+rows = make_rows(3000, seed=1)
+
+
+class FakePool:
+    # Stands in for ThreadedConnectionPool, with connections from the patched psycopg2.connect
+    def __init__(self, minconn, maxconn, **credentials):
+        self.credentials = credentials
+
+    def getconn(self):
+        return PSQL_Extractor.psycopg2.connect(**self.credentials)
+
+    def putconn(self, conn):
+        conn.close()
+
+    def closeall(self):
+        pass
+
+
+class ConnectionDropped(Exception):
+    pass
+
+
+def dropping_connect(after_rows):
+    # Like fake_connect, but the connection drops once the run has fetched after_rows rows
+    fetched = [0]
+
+    class DroppingCursor(FakeCursor):
+        def fetchmany(self, size=None):
+            if fetched[0] >= after_rows:
+                raise ConnectionDropped()
+            batch = super().fetchmany(size)
+            fetched[0] += len(batch)
+            return batch
+
+    class DroppingConnection(FakeConnection):
+        def cursor(self, name=None):
+            return DroppingCursor(self.rows, name)
+
+    return lambda **credentials: DroppingConnection(rows)
+
+
+def extract(tmp_path, monkeypatch, name, *options, connect=None):
+    run_dir = tmp_path / name
+    (run_dir / "extracted").mkdir(parents=True, exist_ok=True)
+    (run_dir / "logs").mkdir(exist_ok=True)
+    monkeypatch.chdir(run_dir)
+    monkeypatch.setattr(PSQL_Extractor.psycopg2, "connect", connect or fake_connect(rows))
+    monkeypatch.setattr(PSQL_Extractor, "output_suffix", "")
+    monkeypatch.setattr(PSQL_Extractor, "ThreadedConnectionPool", FakePool)
+    monkeypatch.setattr(PSQL_Extractor, "unique_urls", MemoryDedupeStore())
+    monkeypatch.setattr(sys, "argv", ["PSQL_Extractor.py", "--npm", "--pypi", "--maven", "--filter-count", "0", *options])
+
+    PSQL_Extractor.main()
+
+    outputs = {file_name: (run_dir / "extracted" / file_name).read_bytes() for file_name in sorted(os.listdir(run_dir / "extracted"))
+               if not file_name.startswith("partial_") and not file_name.endswith(".sqlite")}
+    metrics = [json.loads((run_dir / "logs" / file_name).read_text()) for file_name in sorted(os.listdir(run_dir / "logs")) if file_name.endswith("_metrics.json")]
+    return outputs, metrics
+
+
+def totals(metrics):
+    dropped = {}
+    for summary in metrics:
+        for reason, count in summary["dropped"].items():
+            dropped[reason] = dropped.get(reason, 0) + count
+    return sum(summary["rows_fetched"] for summary in metrics), sum(summary["emitted"] for summary in metrics), dropped
+
+
+@pytest.mark.parametrize("options", [
+    ("--concurrent",),
+    ("--concurrent", "--sort-buffer-mb", "1"),
+    ("--workers", "2"),
+])
+def test_same_outputs_and_counts_as_sequential(tmp_path, monkeypatch, options):
+    expected_outputs, expected_metrics = extract(tmp_path, monkeypatch, "sequential")
+    outputs, metrics = extract(tmp_path, monkeypatch, "other", *options)
+
+    assert outputs == expected_outputs
+    assert totals(metrics) == totals(expected_metrics)
+    assert totals(metrics)[1] == sum(output.count(b"\n") for output in outputs.values())
+
+
+@pytest.mark.parametrize("options", [
+    ("--workers", "0"),
+    ("--concurrent", "--workers", "2"),
+    ("--concurrent", "--incremental"),
+    ("--concurrent", "--resumable"),
+    ("--incremental", "--dedupe-store", "sqlite"),
+    ("--incremental", "--workers", "4"),
+    ("--incremental", "--sort-buffer-mb", "64"),
+    ("--incremental", "--display-db-size"),
+])
+def test_rejected_options(tmp_path, monkeypatch, options):
+    with pytest.raises(SystemExit) as error:
+        extract(tmp_path, monkeypatch, "rejected", *options)
+    assert error.value.code == 2
+
+
+def packages_by_output(outputs):
+    # Lines of every file written for the same ecosystem and threshold, whatever run suffix it has
+    packages = {}
+    for file_name, output in outputs.items():
+        packages.setdefault(file_name.split("_tempy")[0], []).extend(output.splitlines())
+    return {name: sorted(lines) for name, lines in packages.items()}
+
+
+@pytest.mark.parametrize("options", [
+    (),
+    ("--sort-buffer-mb", "1"),
+    ("--concurrent",),
+    ("--filter-count", "0", "100"),
+])
+def test_crash_then_rerun_with_sqlite_store(tmp_path, monkeypatch, options):
+    # Commit often, like a run over the real table does between its first and last fetch
+    monkeypatch.setattr(SqliteDedupeStore.__init__, "__defaults__", (10,))
+    # One output suffix per run, even within the same second
+    runs = iter(range(10))
+    strftime = PSQL_Extractor.time.strftime
+    monkeypatch.setattr(PSQL_Extractor.time, "strftime",
+                        lambda format, *args: f"_run{next(runs)}" if format == "_%Y%m%d-%H%M%S" else strftime(format, *args))
+    store = ("--dedupe-store", "sqlite", "--dedupe-path", "seen.sqlite")
+
+    expected_outputs, _ = extract(tmp_path, monkeypatch, "clean", *store, *options)
+
+    with pytest.raises(ConnectionDropped):
+        extract(tmp_path, monkeypatch, "crashed", *store, *options, connect=dropping_connect(after_rows=1500))
+    outputs, _ = extract(tmp_path, monkeypatch, "crashed", *store, *options)
+
+    # The rerun writes what the crashed run could not, nothing is lost or written twice
+    assert packages_by_output(outputs) == packages_by_output(expected_outputs)
+    assert sum(output.count(b"\n") for output in expected_outputs.values()) > 1000
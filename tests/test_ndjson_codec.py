@@ -0,0 +1,35 @@
+import json
+import pytest
+import ndjson_codec as codec
+
+# Package lines as the extractor writes them, and as other tools may: escaped or raw unicode,
+# compact separators, 64-bit ints, floats and nested repo metadata
+lines = [
+    '{"package_repo": "https://github.com/owner/pkg", "package_name": "pkg", "repo_owner": "owner", "package_ecosystem": "npm", '
+    '"package_licenses": {"Normalised License": "MIT", "licenses": ["MIT", null], "GitHub_License": {"key": "mit", "spdx_id": "MIT", "url": null}}, '
+    '"package_language": "JavaScript", "package_starcount": 12, "downloads": 9223372036854775807}',
+    '{"package_repo": "https://gitlab.com/\\u00e9quipe/caf\\u00e9", "package_name": "caf\\u00e9 \\ud83d\\ude00", "repo_owner": "\\u00e9quipe", '
+    '"package_ecosystem": "pypi", "package_licenses": null, "package_language": null, "package_starcount": null, "downloads": -9223372036854775808}',
+    '{"package_repo":"https://github.com/所有者/包","package_name":"包 😀","repo_owner":"所有者","package_ecosystem":"maven",'
+    '"package_licenses":[{"type":"GPL-3.0","url":"https://www.gnu.org/licenses/gpl-3.0"}],"package_language":"Java","package_starcount":0,"downloads":0}',
+    '{"package_repo": "https://github.com/o/r", "metadata": {"stars": 1.5, "ratio": 1e+16, "tiny": 5e-324, "nested": [[[]], {"a": {"b": [true, false]}}]}, '
+    '"quoted": "tab\\t \\"quote\\" back\\\\slash / \\/ \\u0000", "downloads": 9007199254740993}',
+]
+
+
+@pytest.mark.parametrize("backend", ["orjson", "msgspec", "json"])
+def test_loads_same_objects_for_every_backend(backend):
+    if backend not in codec.available_backends():
+        pytest.skip(f"{backend} is not installed")
+
+    loads = codec.make_codec(backend)[0]
+    for line in lines:
+        expected = json.loads(line)
+        assert loads(line) == expected
+        assert loads(line.encode("utf-8")) == expected
+        # Same types too, e.g. no int read as a float
+        assert json.dumps(loads(line)) == json.dumps(expected)
+
+
+def test_loads_accepts_bytes():
+    assert codec.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
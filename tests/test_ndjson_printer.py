@@ -0,0 +1,57 @@
+import os, random, subprocess, sys
+from importlib.machinery import SourceFileLoader
+from importlib.util import spec_from_loader, module_from_spec
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ndjson_printer is a script without a .py extension
+loader = SourceFileLoader("ndjson_printer", os.path.join(root, "ndjson_printer"))
+ndjson_printer = module_from_spec(spec_from_loader("ndjson_printer", loader))
+loader.exec_module(ndjson_printer)
+AggregationState = ndjson_printer.AggregationState
+
+
+def make_traces(count, seed=0):
+    rng = random.Random(seed)
+    traces = []
+    for i in range(count):
+        usages = [{
+            "subject": rng.choice([f"input {rng.randrange(40)}", None, 7, ["a", "list"]]),
+            "stack": {"entries": [
+                {"caller": {"object": rng.choice(["RegExp", "String"])}, "file_info": {"file_path": f"src/file{rng.randrange(5)}.js"}}
+                for _ in range(rng.randrange(1, 4))
+            ]},
+        } for _ in range(rng.randrange(1, 5))]
+        traces.append({"pattern": f"^p{i % 13}$", "usages": usages})
+    return traces
+
+
+def aggregate(traces, **kwargs):
+    state = AggregationState(**kwargs)
+    try:
+        for trace in traces:
+            state.add(trace)
+        return list(state.results(with_counts=True)), len(state.run_files)
+    finally:
+        state.close()
+
+
+@pytest.mark.parametrize("max_inputs", [None, 3])
+@pytest.mark.parametrize("max_fan_in", [2, 5])
+def test_spilling_does_not_change_results(tmp_path, monkeypatch, max_inputs, max_fan_in):
+    traces = make_traces(300)
+    expected, _ = aggregate(traces, max_inputs=max_inputs)
+
+    monkeypatch.setattr(AggregationState, "max_fan_in", max_fan_in)
+    spilled, run_files = aggregate(traces, max_bytes=1, temp_dir=str(tmp_path), max_inputs=max_inputs)
+
+    assert spilled == expected
+    assert run_files < max_fan_in
+    assert os.listdir(tmp_path) == []
+
+
+def test_spill_mb_must_be_positive(tmp_path):
+    result = subprocess.run([sys.executable, os.path.join(root, "ndjson_printer"), "in.ndjson", "out.ndjson", "--spill-mb", "0"],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--spill-mb" in result.stderr
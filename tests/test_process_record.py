@@ -0,0 +1,76 @@
+import time
+from functools import partial
+import pytest
+
+PSQL_Extractor = pytest.importorskip("PSQL_Extractor")
+from dedupe_store import MemoryDedupeStore
+from metrics import ExtractionMetrics
+
+
+def packages_row(repo_metadata, repository_url="https://github.com/Owner/Repo.git", homepage=None):
+    # Columns of packages_query
+    return (1, 2, "repo", "npm", "MIT", repository_url, homepage, ["MIT"], repo_metadata, 100)
+
+
+def projected_row(repo_metadata, repository_url="https://github.com/Owner/Repo.git"):
+    # What projected_query selects for the same row
+    has_metadata = repo_metadata is not None and repo_metadata != {}
+    metadata = repo_metadata or {}
+    return (1, "npm", "MIT", ["MIT"], repository_url, has_metadata, metadata.get("full_name"), metadata.get("owner"),
+            metadata.get("license"), metadata.get("language"), metadata.get("stargazers_count"), 100)
+
+
+def process(processor, row):
+    stats = ExtractionMetrics("test", 3600)
+    return processor(row, seen=MemoryDedupeStore(), stats=stats), stats.snapshot()["dropped"]
+
+
+def test_null_metadata_is_like_empty_metadata():
+    package, dropped = process(PSQL_Extractor.process_record, packages_row(None))
+
+    assert package == process(PSQL_Extractor.process_record, packages_row({}))[0]
+    assert package["package_repo"] == "https://github.com/owner/repo"
+    assert package["package_licenses"] is None
+    assert dropped == {}
+
+
+@pytest.mark.parametrize("repo_metadata", [
+    None,
+    {},
+    {"full_name": "Owner/Repo", "owner": "Owner", "license": "mit", "language": "JavaScript", "stargazers_count": 5},
+    {"full_name": None, "owner": "Owner"},
+    {"full_name": "Owner/Repo", "owner": None},
+])
+def test_projected_query_rows_give_the_same_packages(repo_metadata):
+    assert process(PSQL_Extractor.process_record, packages_row(repo_metadata)) == \
+        process(PSQL_Extractor.process_record_projected, projected_row(repo_metadata))
+
+
+def test_null_metadata_without_usable_url():
+    package, dropped = process(PSQL_Extractor.process_record, packages_row(None, repository_url="https://example.com/repo"))
+    assert package is None
+    assert dropped == {"url_not_matched": 1}
+
+
+class SlowSink(list):
+    # Like an ExternalSortWriter spilling to disk
+    def append(self, package):
+        time.sleep(0.02)
+        super().append(package)
+
+
+def test_sink_time_is_not_process_time():
+    stats = ExtractionMetrics("test", 3600)
+    rows = [packages_row(None, repository_url=f"https://github.com/owner/repo{i}") for i in range(10)]
+    sink = SlowSink()
+
+    PSQL_Extractor.process_batch(rows, sink, partial(PSQL_Extractor.process_record, seen=MemoryDedupeStore(), stats=stats), stats)
+
+    snapshot = stats.snapshot()
+    assert len(sink) == snapshot["emitted"] == 10
+    assert snapshot["sink_seconds"] >= 0.2
+    assert snapshot["process_record_seconds"] < 0.1
+
+    merged = ExtractionMetrics("merged", 3600)
+    merged.merge(snapshot)
+    assert merged.snapshot()["sink_seconds"] == snapshot["sink_seconds"]
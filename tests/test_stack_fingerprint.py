@@ -0,0 +1,56 @@
+import json, sys
+import importlib.util
+import pytest
+import stack_fingerprint
+from stack_fingerprint import canonical, digest64, fingerprint
+
+values = [
+    None, True, 0, -12, "", "é ü 中 \"quoted\"\n",
+    ["a", 1, None],
+    {"entries": [{"caller": {"object": "RegExp", "method": "exec"}, "file_info": {"file_path": "src/a.js", "line": 3, "column": 7}}]},
+]
+
+
+def test_canonical_is_compact_sorted_utf8():
+    for value in values:
+        assert canonical(value) == json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def test_key_order_does_not_matter():
+    assert fingerprint({"b": [1, {"y": 2, "x": 1}], "a": "s"}) == fingerprint({"a": "s", "b": [1, {"x": 1, "y": 2}]})
+
+
+def test_fingerprints_are_64_bit_and_tell_values_apart():
+    fingerprints = [fingerprint(value) for value in values]
+    assert all(0 <= value < 2**64 for value in fingerprints)
+    assert len(set(fingerprints)) == len(values)
+    assert fingerprint(1) != fingerprint("1") != fingerprint([1])
+
+
+def test_stable_across_runs():
+    # Fingerprints are stored and sent between processes, they must not change
+    assert fingerprint({"b": ["é"], "a": 1}) == digest64('{"a":1,"b":["é"]}'.encode("utf-8"))
+    if stack_fingerprint.hash_backend == "blake2b_64":
+        assert fingerprint({"b": ["é"], "a": 1}) == 0x86a2c939b9610f96
+
+
+floats = [1e16, 1e-7, 0.1, -0.0, 1.5e300, 123456789.123, 2.0**-1074, {"ratio": 1e22, "values": [3.0, 1e-5]}]
+
+
+def load_without_orjson(monkeypatch):
+    # A fresh copy of the module, imported as on a machine without orjson
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    spec = importlib.util.spec_from_file_location("stack_fingerprint_without_orjson", stack_fingerprint.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_floats_do_not_depend_on_orjson(monkeypatch):
+    pytest.importorskip("orjson")
+    without_orjson = load_without_orjson(monkeypatch)
+
+    for value in floats:
+        assert canonical(value) == without_orjson.canonical(value)
+        assert fingerprint(value) == without_orjson.fingerprint(value)
+    assert canonical(1e16) == b"1e+16"